@@ -1,15 +1,27 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import base64
+import matplotlib.pyplot as plt
 from datetime import date
-import calendar
 from io import BytesIO
 import plotly.express as px
 import plotly.graph_objects as go
 import os
 
+import affichage
+import analyses
+import cache
+import calendrier
+import cube
+import echeances
+import export
+import filtres
+import generation
+import moteur_sql
+import periodes
+import registre_bonus
+import stockage
+
 
 # Configuration de la page
 st.set_page_config(
@@ -31,243 +43,88 @@ Cette application permet de suivre l'activité d'un établissement de réparatio
 
 
 # Fonction pour générer des données fictives
-@st.cache_data
 def generate_sample_data():
-    # Données des prestations
-    num_prestations = 1000
-    dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='D')
-
-    types_prestation = ['Revision intermediaire','Revision generale', 'Freinage',
-                        'Carrosserie', 'Pneus', 'Suspension', 'Geometrie',
-                        'Embrayage', 'Batterie', 'Climatisation', 'Diagnostic', 'Kit Distribution']
-
-    types_vehicule = ['Citadine', 'Berline', 'SUV', 'Utilitaire', 'Break']
-
-    mechaniciens = ['Saddem', 'Ismail']
-    carrossiers = ['Sohaib']
-
-    prestations = pd.DataFrame({
-        'date': np.random.choice(dates, num_prestations),
-        'type_prestation': np.random.choice(types_prestation, num_prestations),
-        'type_vehicule': np.random.choice(types_vehicule, num_prestations),
-        'technicien': np.random.choice(mechaniciens + carrossiers, num_prestations),
-        'main_oeuvre_heures': np.random.uniform(0.5, 8, num_prestations).round(1),
-        'montant_main_oeuvre': np.random.uniform(50, 800, num_prestations).round(2),
-        'montant_pieces': np.random.uniform(20, 1500, num_prestations).round(2),
-        'marge_pieces': np.random.uniform(0.1, 0.4, num_prestations).round(2),
-        'tva_applicable': np.random.choice([0.2], num_prestations),
-        'client': np.random.choice(['Particulier', 'Entreprise', 'Assurance'], num_prestations,
-                                   p=[0.6, 0.3, 0.1])
-    })
-
-    prestations['montant_pieces_fournisseur'] = prestations['montant_pieces'] / (1 + prestations['marge_pieces'])
-    prestations['montant_total_ht'] = prestations['montant_main_oeuvre'] + prestations['montant_pieces']
-    prestations['montant_total_ttc'] = prestations['montant_total_ht'] * (1 + prestations['tva_applicable'])
-    prestations['marge_totale'] = prestations['montant_main_oeuvre'] * 0.7 + (
-                prestations['montant_pieces'] - prestations['montant_pieces_fournisseur'])
-
-    # Données des charges
-    charges_types = ['Loyer', 'Électricité', 'Eau', 'Internet', 'Assurance', 'Alarme',
-                     'Salaires', 'Charges sociales', 'Fournitures', 'Dette OI',
-                     'Publicité', 'Comptabilité', 'Forfait tel', 'Carburant', 'IRP',
-                     'Dette Irp', 'SPSAO', 'Renault', 'Flauraud', 'La Cora', 'AD',
-                     'Ouest Injection', 'P&P']
-
-    charges_data = []
-    for month in range(1, 13):  # Janvier à Decembre 2024
-        for charge_type in charges_types:
-            if charge_type == 'Salaires':
-                montant = np.random.uniform(3800, 5300, 1)[0]
-            elif charge_type == 'Charges sociales':
-                montant = np.random.uniform(2000, 2500, 1)[0]
-            elif charge_type == 'Loyer':
-                montant = np.random.uniform(1830, 1950, 1)[0]
-            elif charge_type == 'Électricité':
-                montant = np.random.uniform(190, 350, 1)[0]
-            elif charge_type == 'Eau':
-                montant = np.random.uniform(50, 150, 1)[0]
-            elif charge_type == 'Assurance':
-                montant = np.random.uniform(380, 450, 1)[0]
-            elif charge_type == 'Alarme':
-                montant = np.random.uniform(134, 150, 1)[0]
-            elif charge_type == 'Comptabilité':
-                montant = np.random.uniform(200, 300, 1)[0]
-            elif charge_type == 'Flauraud':
-                montant = np.random.uniform(1700, 2900, 1)[0]
-            elif charge_type == 'Carburant':
-                montant = np.random.uniform(320, 400, 1)[0]
-            elif charge_type == 'Ouest Injection':
-                montant = np.random.uniform(1500, 2300, 1)[0]
-            elif charge_type == 'P&P':
-                montant = np.random.uniform(1000, 1900, 1)[0]
-            else:
-                montant = np.random.uniform(100, 2000, 1)[0]
-
-            charges_data.append({
-                'date': f'2024-{month:02d}-01',
-                'type': charge_type,
-                'montant': round(montant, 2),
-                'payee': np.random.choice([True, False], p=[0.8, 0.2])
-            })
-
-    charges = pd.DataFrame(charges_data)
-    charges['date'] = pd.to_datetime(charges['date'])
-
-    # Données du personnel
-    personnel_data = []
-    for nom in mechaniciens + carrossiers:
-        for month in range(1, 13):  # Janvier à Decembre 2024
-            days_in_month = calendar.monthrange(2024, month)[1]
-            absences = np.random.randint(0, 4)  # 0 à 3 jours d'absence par mois
-
-            for _ in range(absences):
-                day = np.random.randint(1, days_in_month + 1)
-                personnel_data.append({
-                    'nom': nom,
-                    'date': f'2024-{month:02d}-{day:02d}',
-                    'type_absence': np.random.choice(['Maladie', 'Congé payé', 'Formation', 'Sans solde']),
-                    'duree': np.random.randint(1, 4),  # 1 à 3 jours
-                    'status': 'Mécanicien' if nom in mechaniciens else 'Carrossier'
-                })
-
-    absences = pd.DataFrame(personnel_data)
-    absences['date'] = pd.to_datetime(absences['date'])
-
-    # Données des fournisseurs
-    fournisseurs_data = []
-    fournisseurs = ['Flauraud', 'P&P', 'Ouest Injection', 'La Cora AD', 'SPSAO', 'Renault', 'Audi VW']
-
-    for month in range(1, 13):  # Janvier à Decembre 2024
-        for fournisseur in fournisseurs:
-            for _ in range(np.random.randint(1, 10)):  # 1 à 9 commandes par mois par fournisseur
-                day = np.random.randint(1, calendar.monthrange(2024, month)[1] + 1)
-                montant = np.random.uniform(500, 3000, 1)[0]
-                fournisseurs_data.append({
-                    'date': f'2024-{month:02d}-{day:02d}',
-                    'fournisseur': fournisseur,
-                    'montant': round(montant, 2),
-                    'payee': np.random.choice([True, False], p=[0.7, 0.3]),
-                    'delai_paiement': np.random.choice([30, 45, 60])
-                })
-
-    fournisseurs_df = pd.DataFrame(fournisseurs_data)
-    fournisseurs_df['date'] = pd.to_datetime(fournisseurs_df['date'])
-
-    return prestations, charges, absences, fournisseurs_df
-
-    # Génération des données de bonus
-    bonus_data = []
-    for month in range(1, 13):  # Janvier à Décembre 2024
-        for _ in range(np.random.randint(1, 6)):  # De 1 à 5 bonus par mois
-            day = np.random.randint(1, calendar.monthrange(2024, month)[1] + 1)
-            amount = np.random.uniform(50, 1000)  # Montant entre 50 et 1000 euros
-            description = np.random.choice([
-                "Bonus performance trimestrielle",
-                "Bonus fidélité client",
-                "Bonus innovation technique",
-                "Bonus qualité service",
-                "Bonus dépassement objectif"
-            ])
-            bonus_data.append({
-                'date': f'2024-{month:02d}-{day:02d}',
-                'amount': round(amount, 2),
-                'description': description
-            })
-
-    bonus_df = pd.DataFrame(bonus_data)
-    bonus_df['id_bonus'] = range(1, len(bonus_df) + 1)
-    bonus_df['date'] = pd.to_datetime(bonus_df['date'])
-
-    # Intégrer les données de bonus dans le dictionnaire des données
-    if "bonus" not in data:
-        data["bonus"] = pd.DataFrame()
-    data["bonus"] = pd.concat([data["bonus"], bonus_df], ignore_index=True)
-"""
-    # Interface utilisateur pour ajouter des bonus
-    with st.expander("Ajouter un Bonus"):
-        col1, col2 = st.columns(2)
-        with col1:
-            new_date = st.date_input("Date du Bonus")
-            new_amount = st.number_input("Montant du Bonus", min_value=0)
-        with col2:
-            new_description = st.text_input("Description du Bonus")
+    donnees = generation.generer_donnees()
+    return tuple(donnees[nom] for nom in ('prestations', 'charges', 'absences', 'fournisseurs'))
+
+
+# Dernières tables lues dans le stockage et état du stockage (manifestes) au moment de leur lecture, partagés par
+# toutes les sessions pour mettre à jour les tables sans tout relire quand les données changent
+@st.cache_resource
+def dernier_chargement():
+    return {}
+
+
+# Tables du stockage : après un import, seuls les mois modifiés de chaque table (et du cube) sont relus, les autres
+# lignes sont reprises des tables déjà en mémoire. L'état est lu avant les tables : une écriture concurrente est
+# au pire relue une seconde fois.
+def charger_tables():
+    etat = stockage.etat_stockage()
+    precedent = dernier_chargement().get('jeu')
+    if precedent is None:
+        prestations, charges, absences, fournisseurs = stockage.charger_donnees()
+        tables = {'prestations': prestations, 'cube': stockage.charger_cube(), 'charges': charges,
+                  'absences': absences, 'fournisseurs': fournisseurs}
+    else:
+        etat_precedent, tables_precedentes = precedent
+        stockage.construire_cube_absent()
+        tables = {nom: stockage.recharger_table(nom, df, etat_precedent[nom])
+                  for nom, df in tables_precedentes.items()}
+    dernier_chargement()['jeu'] = (etat, tables)
+    return tables
+
+
+# Jeu de données partagé par toutes les sessions, pour une version des données (mis à jour quand une partition
+# change) : les tables, le cube d'agrégats matérialisé dans le stockage, les index bitmap des colonnes filtrables et
+# les index de tri du tableau des prestations.
+# Seule la lecture des tables est incrémentale : les index bitmap et les index de tri sont reconstruits en mémoire
+# sur les tables entières à chaque nouvelle version, et les caches dérivés (sélections, figures) sont vidés.
+# st.cache_resource renvoie le même objet à chaque session, sans la copie que st.cache_data désérialise à chaque
+# appel, et ne garde qu'une version en mémoire. Les tables sont partagées : elles ne sont jamais modifiées en place.
+@st.cache_resource(max_entries=1)
+def charger_jeu_donnees(version):
+    if version is None:
+        prestations, charges, absences, fournisseurs = generate_sample_data()
+        tables = {'prestations': prestations, 'cube': cube.construire_cube(prestations), 'charges': charges,
+                  'absences': absences, 'fournisseurs': fournisseurs}
+    else:
+        tables = charger_tables()
 
-        if st.button("Ajouter le Bonus"):
-            # Ajout des données dans le DataFrame
-            data['bonus'] = pd.concat([
-                data['bonus'],
-                pd.DataFrame({
-                    'id_bonus': [len(data['bonus']) + 1],
-                    'date': [new_date],
-                    'amount': [new_amount],
-                    'description': [new_description]
-                })
-            ])
-"""
-    # Section pour visualiser les bonus
-    with st.expander("Analyse des Bonus"):
-        col1, col2 = st.columns(2)
+    index = {nom: filtres.construire_index(tables[nom]) for nom in ('prestations', 'cube')}
+    return tables, index, affichage.index_tri(tables['prestations'])
 
-        # Graphique de l'évolution des bonus au fil du temps
-        with col1:
-            st.subheader("Évolution des bonus")
-            if not data['bonus'].empty:
-                fig = px.line(data['bonus'], x='date', y='amount',
-                              title="Montant des bonus au fil du temps",
-                              labels={'x': 'Date', 'y': 'Montant'})
-                st.plotly_chart(fig)
-            else:
-                st.info("Aucun bonus enregistré pour l'instant.")
 
-        # Tableau des bonus
-        with col2:
-            st.subheader("Liste des bonus")
-            if not data['bonus'].empty:
-                st.dataframe(data['bonus'],
-                             column_config={
-                                 'id_bonus': {'visible': False},
-                                 'date': {'label': 'Date'},
-                                 'amount': {'label': 'Montant', 'format': '${{value:.2f}'},
-                                 'description': {'label': 'Description'}
-                             })
-            else:
-                st.info("Aucun bonus enregistré pour l'instant.")
-"""
-    # Sauvegarde dans le fichier CSV
-    data['bonus'].to_csv(f"{data_dir}/bonus.csv", index=False)
-    st.success("Bonus ajouté avec succès !")
-"""
-    # Visualisation des bonus existants
-    st.subheader("Historique des Bonus")
-    st.dataframe(data['bonus'], use_container_width=True)
+# Moteur SQL (DuckDB) sur le stockage, partagé par toutes les sessions et recréé quand les données changent.
+# Les bornes et les valeurs des filtres sont lues sur le cube : il est construit d'abord s'il manque.
+@st.cache_resource(max_entries=1)
+def charger_moteur(version):
+    stockage.construire_cube_absent()
+    return moteur_sql.MoteurSQL()
 
-    # Interface utilisateur pour filtrer les bonus par période
-    st.subheader("Calcul du Total des Bonus selon la Période")
-    start_date = st.date_input("Date de Début", date.today())
-    end_date = st.date_input("Date de Fin", date.today())
 
-    if start_date <= end_date:
-        filtered_bonus = data['bonus'][
-            (data['bonus']['date'] >= start_date) &
-            (data['bonus']['date'] <= end_date)
-            ]
+version_donnees = stockage.version_stockage()
 
-        total_amount = filtered_bonus['amount'].sum()
-        st.write(f"Montant Total du Bonus pour la période : **{total_amount}**")
-    else:
-        st.warning("La date de fin doit être supérieure ou égale à la date de début.")
+if moteur_sql.actif():
+    # Les tables restent sur disque : bornes, valeurs des filtres et sélections sont calculées par DuckDB
+    moteur = charger_moteur(version_donnees)
+    min_date, max_date = (borne.date() for borne in moteur.bornes_dates())
+    valeurs_filtres = {colonne: moteur.valeurs(colonne) for colonne in filtres.COLONNES_FILTRABLES}
+else:
+    moteur = None
+    tables, index_prestations, tri_prestations = charger_jeu_donnees(version_donnees)
+    prestations = tables['prestations']
 
+    min_date = prestations['date'].min().date()
+    max_date = prestations['date'].max().date()
+    valeurs_filtres = {colonne: filtres.valeurs_filtre(prestations[colonne]) for colonne in filtres.COLONNES_FILTRABLES}
 
-# Charger les données
-prestations, charges, absences, fournisseurs = generate_sample_data()
+if version_donnees is None:
+    st.info(f"Aucune donnée dans {stockage.DOSSIER_DONNEES} : affichage de données fictives.")
 
 # Sidebar - Paramètres généraux
 st.sidebar.header('Filtres')
 
 # Filtres de date
-min_date = prestations['date'].min().date()
-max_date = prestations['date'].max().date()
-
 date_range = st.sidebar.date_input(
     "Période d'analyse",
     value=(min_date, max_date),
@@ -275,97 +132,172 @@ date_range = st.sidebar.date_input(
     max_value=max_date
 )
 
-if len(date_range) == 2:
-    start_date, end_date = date_range
-    mask_date = (prestations['date'].dt.date >= start_date) & (prestations['date'].dt.date <= end_date)
-    filtered_prestations = prestations[mask_date]
+# Filtre par type de prestation
+types_prestation_unique = valeurs_filtres['type_prestation']
+selected_types = st.sidebar.multiselect('Type de prestation', types_prestation_unique, default=types_prestation_unique)
+
+# Filtre par technicien
+techniciens_unique = valeurs_filtres['technicien']
+selected_techniciens = st.sidebar.multiselect('Technicien', techniciens_unique, default=techniciens_unique)
+
+# Filtre par type de véhicule
+types_vehicule_unique = valeurs_filtres['type_vehicule']
+selected_vehicules = st.sidebar.multiselect('Type de véhicule', types_vehicule_unique, default=types_vehicule_unique)
+
+# Filtre par type de client
+clients_unique = valeurs_filtres['client']
+selected_clients = st.sidebar.multiselect('Client', clients_unique, default=clients_unique)
+
+# Format des fichiers téléchargés depuis les onglets
+format_export = st.sidebar.selectbox('Format des exports', list(export.FORMATS))
+
+# Regroupement temporel des graphiques d'évolution
+granularite = st.sidebar.selectbox('Regroupement par', list(periodes.GRANULARITES), index=1)
+
 
-    mask_date_charges = (charges['date'].dt.date >= start_date) & (charges['date'].dt.date <= end_date)
-    filtered_charges = charges[mask_date_charges]
+# Cache des agrégats dérivés (sélections filtrées, analyses), partagé entre les sessions et borné en entrées et
+# en mémoire : au-delà du plafond, les moins récemment utilisés sont évincés. Un cache par version des données,
+# celui de la version précédente est libéré quand les données changent.
+PLAFOND_CACHE_MO = int(os.environ.get('DASHBOARD_CACHE_MO', 256))
 
-    mask_date_absences = (absences['date'].dt.date >= start_date) & (absences['date'].dt.date <= end_date)
-    filtered_absences = absences[mask_date_absences]
 
-    mask_date_fournisseurs = (fournisseurs['date'].dt.date >= start_date) & (fournisseurs['date'].dt.date <= end_date)
-    filtered_fournisseurs = fournisseurs[mask_date_fournisseurs]
+@st.cache_resource(max_entries=1)
+def cache_selections(version):
+    return cache.CacheLRU(max_entrees=32, max_octets=PLAFOND_CACHE_MO * 1024 ** 2)
+
+
+# Sélection normalisée : une sélection vide ou complète ne filtre pas
+periode = tuple(date_range) if len(date_range) == 2 else None
+selections = {
+    'type_prestation': filtres.normaliser_selection(selected_types, types_prestation_unique),
+    'technicien': filtres.normaliser_selection(selected_techniciens, techniciens_unique),
+    'type_vehicule': filtres.normaliser_selection(selected_vehicules, types_vehicule_unique),
+    'client': filtres.normaliser_selection(selected_clients, clients_unique),
+}
+
+# Les sélections multiples sont évaluées sur les index bitmap (OU par colonne, ET entre colonnes),
+# ou traduites en requête SQL avec le moteur DuckDB
+if moteur is not None:
+    selection = cache_selections(version_donnees).obtenir(
+        (version_donnees, periode, tuple(selections.values())),
+        lambda: moteur.filtrer(periode, selections)
+    )
 else:
-    filtered_prestations = prestations
-    filtered_charges = charges
-    filtered_absences = absences
-    filtered_fournisseurs = fournisseurs
+    selection = cache_selections(version_donnees).obtenir(
+        (version_donnees, periode, tuple(selections.values())),
+        lambda: filtres.filtrer(tables, index_prestations, periode, selections)
+    )
 
-# Filtre par type de prestation
-types_prestation_unique = sorted(prestations['type_prestation'].unique())
-selected_types = st.sidebar.multiselect('Type de prestation', types_prestation_unique, default=types_prestation_unique)
+filtered_cube = selection['cube']
+filtered_charges = selection['charges']
+filtered_absences = selection['absences']
+filtered_fournisseurs = selection['fournisseurs']
 
-if selected_types:
-    filtered_prestations = filtered_prestations[filtered_prestations['type_prestation'].isin(selected_types)]
 
-# Filtre par technicien
-techniciens_unique = sorted(prestations['technicien'].unique())
-selected_techniciens = st.sidebar.multiselect('Technicien', techniciens_unique, default=techniciens_unique)
+# Absences qui chevauchent la période, pour le suivi des absences et la capacité des techniciens : le filtre de
+# période ne garde que les absences qui y commencent, celles commencées avant et encore en cours sont reprises de
+# la table complète
+def absences_chevauchantes(debut, fin):
+    if moteur is None:
+        toutes = tables['absences']
+    else:
+        toutes = cache_selections(version_donnees).obtenir(('absences', version_donnees),
+                                                           lambda: moteur.selection('absences'))
+    return calendrier.absences_periode(toutes, debut, fin)
+
+
+# Échéancier de toutes les factures fournisseurs impayées, calculé une fois par version des données : une facture
+# émise avant la période sélectionnée et toujours impayée reste due, la période ne fixe que la date de situation
+def echeancier_complet():
+    return cache_selections(version_donnees).obtenir(
+        ('echeancier', version_donnees),
+        lambda: echeances.echeancier(tables['fournisseurs'] if moteur is None else moteur.selection('fournisseurs'))
+    )
 
-if selected_techniciens:
-    filtered_prestations = filtered_prestations[filtered_prestations['technicien'].isin(selected_techniciens)]
+
+# Prestations brutes de la sélection, pour leur export depuis l'onglet Prestations :
+# avec le moteur SQL, elles ne sont lues que lorsque l'utilisateur télécharge le fichier
+def prestations_filtrees():
+    if moteur is None:
+        return selection['prestations']
+    return cache_selections(version_donnees).obtenir(
+        ('prestations', version_donnees, periode, tuple(selections.values())),
+        lambda: moteur.selection('prestations', periode, selections)
+    )
 
 
-# Fonction pour télécharger les données
-def download_df(df, filename):
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}.csv">Télécharger en CSV</a>'
-    return href
+# Cache des figures Plotly, partagé entre les sessions et recréé avec les données. La clé est l'empreinte des
+# données agrégées tracées et de la spécification du graphique (fonction de construction et ses paramètres) :
+# un graphique inchangé d'un rerun à l'autre n'est pas reconstruit.
+@st.cache_resource(max_entries=1)
+def cache_figures(version):
+    return cache.CacheLRU(max_entrees=64)
 
 
-# Organisation en onglets
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "📈 Vue d'ensemble",
-    "🔧 Prestations",
-    "💰 Finances",
-    "👥 Personnel",
-    "📊 Analyses Avancées",
-    "💵 Bonus"
-])
+# Figure construite par construire(donnees, **spec), ou reprise du cache. Les figures en cache sont partagées :
+# construire doit produire la figure complète, elle n'est plus modifiée ensuite. Les grandes traces passent en WebGL.
+def figure(construire, donnees, **spec):
+    return cache_figures(version_donnees).obtenir(
+        cache.empreinte((construire, donnees, spec)),
+        lambda: affichage.webgl(construire(donnees, **spec))
+    )
 
-with tab1:
+
+# Bouton de téléchargement : le fichier n'est encodé (par lots) que lorsque l'utilisateur clique.
+# df peut être une fonction qui renvoie les données, appelée seulement au clic (nb_lignes donne alors leur nombre).
+def download_df(df, filename, nb_lignes=None):
+    extension, mime = export.FORMATS[format_export]
+    donnees = df if callable(df) else lambda: df
+    nb_lignes = len(df) if nb_lignes is None else nb_lignes
+    trop_de_lignes = format_export == 'Excel' and nb_lignes > export.LIGNES_MAX_EXCEL
+    st.download_button(
+        f"Télécharger en {format_export}",
+        data=lambda: export.encoder(donnees(), format_export),
+        file_name=f"{filename}.{extension}",
+        mime=mime,
+        key=f'export_{filename}',
+        on_click='ignore',
+        disabled=trop_de_lignes,
+        help="Trop de lignes pour Excel, choisir CSV ou Parquet" if trop_de_lignes else None,
+    )
+
+
+# Onglet Vue d'ensemble : indicateurs clés, CA hebdomadaire, répartition par prestation et par technicien
+def onglet_vue_ensemble():
     st.header("Vue d'ensemble de l'activité")
 
     # Indicateurs clés
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        total_ca = filtered_prestations['montant_total_ttc'].sum()
+        total_ca = filtered_cube['montant_total_ttc'].sum()
         st.metric("CA Total TTC", f"{total_ca:.2f} €")
 
     with col2:
-        total_marge = filtered_prestations['marge_totale'].sum()
+        total_marge = filtered_cube['marge_totale'].sum()
         st.metric("Marge Totale", f"{total_marge:.2f} €")
 
     with col3:
-        taux_marge = (total_marge / filtered_prestations[
-            'montant_total_ht'].sum()) * 100 if not filtered_prestations.empty else 0
+        taux_marge = (total_marge / filtered_cube[
+            'montant_total_ht'].sum()) * 100 if not filtered_cube.empty else 0
         st.metric("Taux de Marge", f"{taux_marge:.1f} %")
 
     with col4:
-        total_prestations = len(filtered_prestations)
+        total_prestations = filtered_cube['nb_prestations'].sum()
         st.metric("Nombre Prestations", total_prestations)
 
-    # Graphique CA hebdomadaire
+    # Graphique CA par période (semaine par défaut)
     st.subheader("Évolution du CA")
 
-    # Préparer les données par semaine
-    if not filtered_prestations.empty:
-        prestations_by_week = filtered_prestations.copy()
-        prestations_by_week['semaine'] = prestations_by_week['date'].dt.isocalendar().week
-        prestations_by_week['mois'] = prestations_by_week['date'].dt.month
-        weekly_revenue = prestations_by_week.groupby(['mois', 'semaine'])['montant_total_ttc'].sum().reset_index()
-        weekly_revenue['période'] = weekly_revenue.apply(lambda x: f"M{x['mois']}-S{x['semaine']}", axis=1)
+    if not filtered_cube.empty:
+        ca_periodes = analyses.ca_par_periode(filtered_cube, granularite)
 
-        fig = px.bar(
-            weekly_revenue,
+        fig = figure(
+            px.bar,
+            ca_periodes,
             x='période',
             y='montant_total_ttc',
-            title="CA Hebdomadaire",
+            title=f"CA par {granularite.lower()}",
             labels={'montant_total_ttc': 'CA TTC (€)', 'période': 'Période'},
             text_auto='.2s'
         )
@@ -377,10 +309,10 @@ with tab1:
     col1, col2 = st.columns(2)
 
     with col1:
-        if not filtered_prestations.empty:
-            prestation_type_revenue = filtered_prestations.groupby('type_prestation')[
-                'montant_total_ttc'].sum().reset_index()
-            fig = px.pie(
+        if not filtered_cube.empty:
+            prestation_type_revenue = cube.agreger(filtered_cube, 'type_prestation', ['montant_total_ttc'])
+            fig = figure(
+                px.pie,
                 prestation_type_revenue,
                 values='montant_total_ttc',
                 names='type_prestation',
@@ -391,15 +323,12 @@ with tab1:
             st.info("Aucune donnée disponible pour la période sélectionnée")
 
     with col2:
-        if not filtered_prestations.empty:
-            tech_performance = filtered_prestations.groupby('technicien').agg({
-                'montant_total_ttc': 'sum',
-                'date': 'count'
-            }).reset_index()
-            tech_performance.rename(columns={'date': 'nb_prestations'}, inplace=True)
+        if not filtered_cube.empty:
+            tech_performance = cube.agreger(filtered_cube, 'technicien', ['montant_total_ttc', 'nb_prestations'])
             tech_performance.sort_values('montant_total_ttc', ascending=False, inplace=True)
 
-            fig = px.bar(
+            fig = figure(
+                px.bar,
                 tech_performance,
                 x='technicien',
                 y=['montant_total_ttc', 'nb_prestations'],
@@ -412,7 +341,53 @@ with tab1:
         else:
             st.info("Aucune donnée disponible pour la période sélectionnée")
 
-with tab2:
+
+# Lignes d'une page des prestations brutes de la sélection, avec le nombre total de lignes retenues par la recherche.
+# Tri, recherche et découpage sont faits côté serveur : seule la page affichée est envoyée au navigateur.
+# En mémoire, l'ordre vient des index de tri du jeu de données ; avec le moteur SQL, la page est une requête
+# ORDER BY ... LIMIT ... OFFSET.
+def page_prestations(colonne, croissant, recherche, numero_page):
+    debut = (numero_page - 1) * affichage.TAILLE_PAGE
+    if moteur is None:
+        lignes = cache_selections(version_donnees).obtenir(
+            ('lignes_prestations', version_donnees, periode, tuple(selections.values()), colonne, croissant,
+             recherche),
+            lambda: affichage.lignes_triees(prestations, selection['prestations'].index.to_numpy(), tri_prestations,
+                                            colonne, croissant, recherche)
+        )
+        return prestations.iloc[lignes[debut:debut + affichage.TAILLE_PAGE]], len(lignes)
+
+    nb_lignes = moteur.compter('prestations', periode, selections, recherche, affichage.COLONNES_RECHERCHE)
+    page = moteur.selection('prestations', periode, selections, ordre=(colonne, croissant),
+                            limite=affichage.TAILLE_PAGE, decalage=debut, recherche=recherche,
+                            colonnes_recherche=affichage.COLONNES_RECHERCHE)
+    return page, nb_lignes
+
+
+# Tableau paginé des prestations brutes : changer de page, de tri ou de recherche ne réexécute que ce fragment
+@st.fragment
+def tableau_prestations():
+    col_recherche, col_tri, col_ordre = st.columns([2, 2, 1])
+    recherche = col_recherche.text_input("Rechercher", key='recherche_prestations',
+                                         placeholder="Prestation, technicien, véhicule, client")
+    colonne = col_tri.selectbox("Trier par", affichage.COLONNES_PRESTATIONS, key='tri_prestations')
+    croissant = col_ordre.selectbox("Ordre", ['Croissant', 'Décroissant'], key='ordre_prestations') == 'Croissant'
+
+    numero_page = st.session_state.get('page_prestations', 1)
+    page, nb_lignes = page_prestations(colonne, croissant, recherche, numero_page)
+    nb_pages = max(1, -(-nb_lignes // affichage.TAILLE_PAGE))
+    if numero_page > nb_pages:
+        # La sélection ou la recherche a réduit le nombre de pages : revenir à la dernière
+        numero_page = st.session_state['page_prestations'] = nb_pages
+        page, nb_lignes = page_prestations(colonne, croissant, recherche, numero_page)
+
+    st.write(f"Nombre de prestations: {nb_lignes}")
+    st.dataframe(affichage.vue_arrow(page, affichage.COLONNES_PRESTATIONS), hide_index=True)
+    st.number_input(f"Page (sur {nb_pages})", min_value=1, max_value=nb_pages, step=1, key='page_prestations')
+
+
+# Onglet Prestations : données brutes, top des marges, analyse par type de véhicule
+def onglet_prestations():
     st.header("Suivi des prestations")
 
     # Filtres supplémentaires pour les prestations
@@ -420,17 +395,26 @@ with tab2:
 
     with col1:
         st.subheader("Données brutes")
-        st.write(f"Nombre de prestations: {len(filtered_prestations)}")
-        st.dataframe(filtered_prestations[['date', 'type_prestation', 'technicien', 'montant_main_oeuvre',
-                                           'montant_pieces', 'montant_total_ttc', 'marge_totale']])
-        st.markdown(download_df(filtered_prestations, "prestations"), unsafe_allow_html=True)
+        tableau_prestations()
+        nb_prestations = (len(selection['prestations']) if moteur is None
+                          else moteur.compter('prestations', periode, selections))
+        download_df(prestations_filtrees, "prestations", nb_lignes=nb_prestations)
 
     with col2:
-        if not filtered_prestations.empty:
+        # Les dix plus fortes marges, lues sur l'index de tri (ou par une requête limitée à dix lignes)
+        if moteur is None:
+            lignes = affichage.lignes_triees(prestations, selection['prestations'].index.to_numpy(), tri_prestations,
+                                             'marge_totale', croissant=False)
+            top_prestations = prestations.iloc[lignes[:10]]
+        else:
+            top_prestations = moteur.selection('prestations', periode, selections, ordre=('marge_totale', False),
+                                               limite=10)
+
+        if not top_prestations.empty:
             st.subheader("Top prestations par marge")
-            top_prestations = filtered_prestations.sort_values('marge_totale', ascending=False).head(10)
 
-            fig = px.bar(
+            fig = figure(
+                px.bar,
                 top_prestations,
                 x='type_prestation',
                 y='marge_totale',
@@ -446,22 +430,18 @@ with tab2:
     # Analyses par type de véhicule
     st.subheader("Analyse par type de véhicule")
 
-    if not filtered_prestations.empty:
-        vehicle_analysis = filtered_prestations.groupby('type_vehicule').agg({
-            'montant_total_ttc': 'sum',
-            'main_oeuvre_heures': 'sum',
-            'date': 'count'
-        }).reset_index()
+    if not filtered_cube.empty:
+        vehicle_analysis = cube.agreger(filtered_cube, 'type_vehicule',
+                                        ['montant_total_ttc', 'main_oeuvre_heures', 'nb_prestations'])
 
-        vehicle_analysis.rename(columns={'date': 'nb_prestations'}, inplace=True)
-        vehicle_analysis['montant_moyen'] = vehicle_analysis['montant_total_ttc'] / vehicle_analysis['nb_prestations']
-        vehicle_analysis['heures_moyennes'] = vehicle_analysis['main_oeuvre_heures'] / vehicle_analysis[
-            'nb_prestations']
+        vehicle_analysis['montant_moyen'] = cube.moyenne(vehicle_analysis, 'montant_total_ttc')
+        vehicle_analysis['heures_moyennes'] = cube.moyenne(vehicle_analysis, 'main_oeuvre_heures')
 
         col1, col2 = st.columns(2)
 
         with col1:
-            fig = px.bar(
+            fig = figure(
+                px.bar,
                 vehicle_analysis,
                 x='type_vehicule',
                 y='montant_moyen',
@@ -472,7 +452,8 @@ with tab2:
             st.plotly_chart(fig, use_container_width=True, key='type_vehicule')
 
         with col2:
-            fig = px.bar(
+            fig = figure(
+                px.bar,
                 vehicle_analysis,
                 x='type_vehicule',
                 y='heures_moyennes',
@@ -484,70 +465,124 @@ with tab2:
     else:
         st.info("Aucune donnée disponible pour la période sélectionnée")
 
-with tab3:
-    st.header("Suivi financier")
 
-    # Répartition CA vs Charges
-    st.subheader("CA vs Charges")
+# CA et charges (barres), résultat et résultat cumulé sur l'année (courbes) par mois, dans l'ordre chronologique ;
+# ou, en comparaison annuelle, le CA et le résultat cumulé de chaque année superposés de janvier à décembre
+def figure_ca_charges(mensuel, vue):
+    fig = go.Figure()
+
+    if vue == 'Chronologique':
+        fig.add_trace(go.Bar(
+            x=mensuel['période'],
+            y=mensuel['CA'],
+            name='CA TTC',
+            marker_color='green'
+        ))
+
+        fig.add_trace(go.Bar(
+            x=mensuel['période'],
+            y=mensuel['Charges'],
+            name='Charges',
+            marker_color='red'
+        ))
+
+        fig.add_trace(go.Scatter(
+            x=mensuel['période'],
+            y=mensuel['Résultat'],
+            name='Résultat',
+            mode='lines+markers',
+            line=dict(color='blue', width=2)
+        ))
+
+        fig.add_trace(go.Scatter(
+            x=mensuel['période'],
+            y=mensuel['Résultat cumulé'],
+            name="Résultat cumulé sur l'année",
+            mode='lines',
+            line=dict(color='blue', width=1, dash='dot')
+        ))
+        titre = 'CA vs Charges par mois'
+    else:
+        for annee, donnees in mensuel.groupby('annee'):
+            fig.add_trace(go.Scatter(
+                x=donnees['nom_mois'],
+                y=donnees['CA'],
+                name=f'CA {annee}',
+                mode='lines+markers'
+            ))
+            fig.add_trace(go.Scatter(
+                x=donnees['nom_mois'],
+                y=donnees['Résultat cumulé'],
+                name=f'Résultat cumulé {annee}',
+                mode='lines',
+                line=dict(dash='dot')
+            ))
+        fig.update_xaxes(categoryorder='array', categoryarray=analyses.MOIS_FR)
+        titre = 'CA et résultat cumulé par mois, année par année'
+
+    fig.update_layout(
+        title=titre,
+        xaxis_title='Mois',
+        yaxis_title='Montant (€)',
+        barmode='group',
+        hovermode='x unified'
+    )
+    return fig
+
+
+# Ancienneté des factures impayées par fournisseur à une date de situation (par défaut la fin de la période), et
+# factures à payer dans la semaine de cette date (une tranche de l'échéancier trié par échéance).
+# Fragment : changer la date ne relance que cette partie.
+@st.fragment
+def echeancier_fournisseurs(echeancier_impayes):
+    fin_periode = periode[1] if periode is not None else date.today()
+    situation = pd.Timestamp(st.date_input("Situation au", min(date.today(), fin_periode),
+                                           key='situation_fournisseurs'))
 
     col1, col2 = st.columns(2)
 
     with col1:
-        if not filtered_prestations.empty and not filtered_charges.empty:
-            # Regrouper les données par mois
-            ca_monthly = filtered_prestations.groupby(filtered_prestations['date'].dt.month)[
-                'montant_total_ttc'].sum().reset_index()
-            ca_monthly.rename(columns={'date': 'mois'}, inplace=True)
-
-            charges_monthly = filtered_charges.groupby(filtered_charges['date'].dt.month)['montant'].sum().reset_index()
-            charges_monthly.rename(columns={'date': 'mois'}, inplace=True)
+        fig = figure(
+            px.bar,
+            echeances.anciennete(echeancier_impayes, situation),
+            x='fournisseur',
+            y='montant',
+            color='tranche',
+            title=f"Factures impayées par ancienneté au {situation:%d/%m/%Y}",
+            labels={'montant': 'Montant impayé (€)', 'fournisseur': 'Fournisseur', 'tranche': 'Retard'},
+            category_orders={'tranche': echeances.TRANCHES},
+            color_discrete_sequence=['#2ca02c', '#ffbf00', '#ff7f0e', '#d62728']
+        )
+        st.plotly_chart(fig, use_container_width=True, key='anciennete_fournisseurs')
 
-            # Fusionner les données
-            months_list = range(1, 13)
-            month_names = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
-            months_df = pd.DataFrame({'mois': list(months_list), 'nom_mois': month_names[:len(months_list)]})
+    with col2:
+        lundi = situation - pd.Timedelta(days=situation.dayofweek)
+        dues = echeances.dues_entre(echeancier_impayes, lundi, lundi + pd.Timedelta(days=6))
 
-            # Joindre les données de CA
-            months_df = pd.merge(months_df, ca_monthly, on='mois', how='left')
-            months_df = pd.merge(months_df, charges_monthly, on='mois', how='left')
-            months_df.rename(columns={'montant_total_ttc': 'CA', 'montant': 'Charges'}, inplace=True)
-            months_df.fillna(0, inplace=True)
+        st.metric("À payer cette semaine", f"{dues['montant'].sum():.2f} €", f"{len(dues)} factures",
+                  delta_color='off')
+        if not dues.empty:
+            st.dataframe(affichage.vue_arrow(dues, ['echeance', 'fournisseur', 'montant', 'date']), hide_index=True)
 
-            # Calcul du résultat
-            months_df['Résultat'] = months_df['CA'] - months_df['Charges']
 
-            # Graphique
-            fig = go.Figure()
+# Onglet Finances : CA vs charges, fournisseurs, marge sur pièces, charges à payer
+def onglet_finances():
+    st.header("Suivi financier")
 
-            fig.add_trace(go.Bar(
-                x=months_df['nom_mois'],
-                y=months_df['CA'],
-                name='CA TTC',
-                marker_color='green'
-            ))
+    # Répartition CA vs Charges
+    st.subheader("CA vs Charges")
 
-            fig.add_trace(go.Bar(
-                x=months_df['nom_mois'],
-                y=months_df['Charges'],
-                name='Charges',
-                marker_color='red'
-            ))
+    col1, col2 = st.columns(2)
 
-            fig.add_trace(go.Scatter(
-                x=months_df['nom_mois'],
-                y=months_df['Résultat'],
-                name='Résultat',
-                mode='lines+markers',
-                line=dict(color='blue', width=2)
-            ))
+    with col1:
+        if not filtered_cube.empty and not filtered_charges.empty:
+            # CA, charges et résultat par année et par mois
+            mensuel = analyses.ca_charges_mensuels(filtered_cube, filtered_charges)
+            vue = st.radio("Affichage", ['Chronologique', 'Comparaison annuelle'], horizontal=True,
+                           key='vue_ca_charges')
 
-            fig.update_layout(
-                title='CA vs Charges par mois',
-                xaxis_title='Mois',
-                yaxis_title='Montant (€)',
-                barmode='group',
-                hovermode='x unified'
-            )
+            # Graphique
+            fig = figure(figure_ca_charges, mensuel, vue=vue)
 
             st.plotly_chart(fig, use_container_width=True, key='ca_charge')
         else:
@@ -556,10 +591,11 @@ with tab3:
     with col2:
         if not filtered_charges.empty:
             # Répartition des charges par type
-            charges_by_type = filtered_charges.groupby('type')['montant'].sum().reset_index()
+            charges_by_type = filtered_charges.groupby('type', observed=True)['montant'].sum().reset_index()
             charges_by_type.sort_values('montant', ascending=False, inplace=True)
 
-            fig = px.pie(
+            fig = figure(
+                px.pie,
                 charges_by_type,
                 values='montant',
                 names='type',
@@ -582,15 +618,13 @@ with tab3:
             unpaid = filtered_fournisseurs[~filtered_fournisseurs['payee']]
             st.write(f"Total factures impayées: {unpaid['montant'].sum():.2f} €")
 
-            # Graphique des factures par fournisseur
-            fournisseur_summary = filtered_fournisseurs.groupby('fournisseur').agg({
-                'montant': 'sum',
-                'payee': lambda x: (~x).sum()  # Compte les non-payées
-            }).reset_index()
-
-            fournisseur_summary.rename(columns={'payee': 'nb_impayees'}, inplace=True)
+            # Graphique des factures par fournisseur, avec le nombre de factures non payées
+            fournisseur_summary = filtered_fournisseurs.assign(nb_impayees=~filtered_fournisseurs['payee']).groupby(
+                'fournisseur', observed=True
+            ).agg(montant=('montant', 'sum'), nb_impayees=('nb_impayees', 'sum')).reset_index()
 
-            fig = px.bar(
+            fig = figure(
+                px.bar,
                 fournisseur_summary,
                 x='fournisseur',
                 y='montant',
@@ -607,17 +641,18 @@ with tab3:
             st.info("Aucune donnée fournisseur disponible pour la période sélectionnée")
 
     with col2:
-        if not filtered_prestations.empty:
+        if not filtered_cube.empty:
             # Ratio pièces vs main d'œuvre
             pieces_mo_data = pd.DataFrame({
                 'Type': ['Pièces', 'Main d\'œuvre'],
                 'Montant': [
-                    filtered_prestations['montant_pieces'].sum(),
-                    filtered_prestations['montant_main_oeuvre'].sum()
+                    filtered_cube['montant_pieces'].sum(),
+                    filtered_cube['montant_main_oeuvre'].sum()
                 ]
             })
 
-            fig = px.pie(
+            fig = figure(
+                px.pie,
                 pieces_mo_data,
                 values='Montant',
                 names='Type',
@@ -628,15 +663,24 @@ with tab3:
             st.plotly_chart(fig, use_container_width=True, key='ratio_pieces_mo')
 
             # Marge sur pièces
-            marge_pieces = filtered_prestations['montant_pieces'].sum() - filtered_prestations[
+            marge_pieces = filtered_cube['montant_pieces'].sum() - filtered_cube[
                 'montant_pieces_fournisseur'].sum()
-            taux_marge_pieces = (marge_pieces / filtered_prestations['montant_pieces_fournisseur'].sum()) * 100 if \
-            filtered_prestations['montant_pieces_fournisseur'].sum() > 0 else 0
+            taux_marge_pieces = (marge_pieces / filtered_cube['montant_pieces_fournisseur'].sum()) * 100 if \
+            filtered_cube['montant_pieces_fournisseur'].sum() > 0 else 0
 
             st.metric("Marge sur pièces", f"{marge_pieces:.2f} €", f"{taux_marge_pieces:.1f}%")
         else:
             st.info("Aucune donnée de prestations disponible pour la période sélectionnée")
 
+    # Échéancier des factures fournisseurs impayées
+    st.subheader("Échéancier fournisseurs")
+
+    echeancier_impayes = echeancier_complet()
+    if not echeancier_impayes.empty:
+        echeancier_fournisseurs(echeancier_impayes)
+    else:
+        st.info("Aucune facture fournisseur impayée")
+
     # Charges à payer
     st.subheader("Charges restant à payer")
 
@@ -644,8 +688,8 @@ with tab3:
         charges_impayees = filtered_charges[~filtered_charges['payee']]
 
         if not charges_impayees.empty:
-            st.dataframe(charges_impayees)
-            st.markdown(download_df(charges_impayees, "charges_a_payer"), unsafe_allow_html=True)
+            st.dataframe(affichage.vue_arrow(charges_impayees))
+            download_df(charges_impayees, "charges_a_payer")
 
             st.metric("Total à payer", f"{charges_impayees['montant'].sum():.2f} €")
         else:
@@ -653,25 +697,115 @@ with tab3:
     else:
         st.info("Aucune donnée de charges disponible pour la période sélectionnée")
 
-with tab4:
+
+# Heures facturées par jour ouvré et par technicien, avec la ligne de l'objectif
+def figure_productivite(heures_par_tech, objectif):
+    fig = px.bar(
+        heures_par_tech,
+        x='technicien',
+        y='moy_heures_jour',
+        title="Heures facturées en moyenne par jour ouvré",
+        labels={'moy_heures_jour': 'Heures facturées/jour', 'technicien': 'Technicien'},
+        text_auto='.1f'
+    )
+
+    # Ligne de l'objectif
+    fig.add_shape(
+        type="line",
+        x0=-0.5,
+        y0=objectif,
+        x1=len(heures_par_tech) - 0.5,
+        y1=objectif,
+        line=dict(color="red", width=2, dash="dash"),
+    )
+
+    fig.add_annotation(
+        x=len(heures_par_tech) / 2,
+        y=objectif + 0.2,
+        text="Objectif",
+        showarrow=False,
+        font=dict(color="red")
+    )
+    return fig
+
+
+# Calendrier des absences : une ligne par employé, une case par jour colorée selon le type d'absence
+def figure_calendrier_absences(occupation, types):
+    libelles = ['Présent'] + list(types)
+    couleurs = ['#f0f0f0'] + px.colors.qualitative.Set2[:len(types)]
+
+    # Échelle de couleurs discrète : une bande de même couleur par valeur de la matrice
+    echelle = []
+    for valeur, couleur in enumerate(couleurs):
+        echelle += [(valeur / len(couleurs), couleur), ((valeur + 1) / len(couleurs), couleur)]
+
+    occupation = occupation.T
+    fig = go.Figure(go.Heatmap(
+        z=occupation.to_numpy(),
+        x=occupation.columns,
+        y=occupation.index,
+        text=np.array(libelles)[occupation.to_numpy()],
+        hovertemplate='%{y}<br>%{x|%d/%m/%Y}<br>%{text}<extra></extra>',
+        colorscale=echelle,
+        zmin=-0.5,
+        zmax=len(couleurs) - 0.5,
+        colorbar=dict(tickvals=list(range(len(couleurs))), ticktext=libelles),
+        xgap=1,
+        ygap=1
+    ))
+
+    fig.update_layout(title="Calendrier des absences", xaxis_title='Date', yaxis_title='Employé')
+    return fig
+
+
+# Absents d'un jour choisi, lus directement sur la ligne de ce jour dans la matrice. Fragment : changer de jour
+# ne relance que cette partie.
+@st.fragment
+def absents_du_jour(calendrier_absences):
+    premier, dernier = calendrier_absences.jours[0].date(), calendrier_absences.jours[-1].date()
+    jour = st.date_input("Absents le", min(max(date.today(), premier), dernier), min_value=premier,
+                         max_value=dernier)
+
+    absents = calendrier_absences.absents(jour)
+    if absents:
+        for nom, type_absence in absents:
+            st.write(f"- {nom} ({type_absence})")
+    else:
+        st.success("Personne n'est absent ce jour-là.")
+
+
+# Onglet Personnel : absences et productivité
+def onglet_personnel():
     st.header("Gestion du personnel")
 
+    # Chaque absence occupe ses duree jours consécutifs dans la matrice jour x employé. Les absences suivies sont
+    # celles qui ont au moins un jour dans la période, comptées sur leurs seuls jours dans la période.
+    if periode is not None:
+        absences = absences_chevauchantes(*periode)
+        calendrier_absences = calendrier.CalendrierAbsences(absences).periode(*periode)
+    else:
+        absences = filtered_absences
+        calendrier_absences = calendrier.CalendrierAbsences(absences)
+
     # Analyse des absences
     st.subheader("Suivi des absences")
 
-    if not filtered_absences.empty:
-        absences_by_person = filtered_absences.groupby('nom').agg({
-            'duree': 'sum',
-            'date': 'count'
-        }).reset_index()
-
-        absences_by_person.rename(columns={'date': 'nb_absences', 'duree': 'jours_absence'}, inplace=True)
+    if not absences.empty:
+        # Jours calendaires d'absence par employé (un jour couvert par deux absences ne compte qu'une fois)
+        jours_absence = calendrier_absences.jours_absence()
+        absences_by_person = pd.DataFrame({
+            'nom': jours_absence.index,
+            'jours_absence': jours_absence.to_numpy(),
+            'nb_absences': absences.groupby('nom', observed=False).size().reindex(jours_absence.index).to_numpy(),
+        })
+        absences_by_person = absences_by_person[absences_by_person['nb_absences'] > 0]
         absences_by_person.sort_values('jours_absence', ascending=False, inplace=True)
 
         col1, col2 = st.columns(2)
 
         with col1:
-            fig = px.bar(
+            fig = figure(
+                px.bar,
                 absences_by_person,
                 x='nom',
                 y='jours_absence',
@@ -682,9 +816,12 @@ with tab4:
             st.plotly_chart(fig, use_container_width=True, key='absences')
 
         with col2:
-            absences_by_type = filtered_absences.groupby('type_absence')['duree'].sum().reset_index()
+            absences_by_type = calendrier_absences.jours_par_type().rename_axis('type_absence').reset_index(
+                name='duree')
+            absences_by_type = absences_by_type[absences_by_type['duree'] > 0]
 
-            fig = px.pie(
+            fig = figure(
+                px.pie,
                 absences_by_type,
                 values='duree',
                 names='type_absence',
@@ -695,84 +832,129 @@ with tab4:
         # Calendrier des absences
         st.subheader("Calendrier des absences")
 
-        absences_by_date = filtered_absences.copy()
-        absences_by_date['semaine'] = absences_by_date['date'].dt.isocalendar().week
-        absences_by_date['mois'] = absences_by_date['date'].dt.month_name()
+        fig = figure(figure_calendrier_absences, calendrier_absences.occupation(), types=calendrier_absences.types)
+        st.plotly_chart(fig, use_container_width=True, key='calendrier_absences')
 
-        # Créer un calendrier mensuel
-        absences_grouped = absences_by_date.groupby(['mois', 'date']).agg({
-            'nom': lambda x: ', '.join(set(x)),
-            'duree': 'sum'
-        }).reset_index()
+        col1, col2 = st.columns(2)
+
+        with col1:
+            absents_du_jour(calendrier_absences)
 
-        # Afficher les données d'absence par jour
-        st.dataframe(absences_grouped[['date', 'nom', 'duree']])
-        st.markdown(download_df(filtered_absences, "absences"), unsafe_allow_html=True)
+        with col2:
+            # Afficher les absents jour par jour
+            st.dataframe(affichage.vue_arrow(calendrier_absences.par_jour()), hide_index=True)
+            download_df(absences, "absences")
     else:
         st.info("Aucune donnée d'absence disponible pour la période sélectionnée")
 
     # Productivité du personnel
     st.subheader("Productivité du personnel")
 
-    if not filtered_prestations.empty:
+    if not filtered_cube.empty:
         # Heures facturées par technicien
-        heures_par_tech = filtered_prestations.groupby('technicien')['main_oeuvre_heures'].sum().reset_index()
+        heures_par_tech = cube.agreger(filtered_cube, 'technicien', ['main_oeuvre_heures'])
         heures_par_tech.sort_values('main_oeuvre_heures', ascending=False, inplace=True)
 
-        # Calculer la moyenne d'heures facturées par jour ouvré (estimé à 20 jours par mois)
-        selected_months = len(set(filtered_prestations['date'].dt.month))
-        jours_ouvres = selected_months * 20  # Estimation
+        # Capacité de chaque technicien : heures des jours ouvrés de la période (hors week-ends et jours fériés)
+        # où il n'est pas absent, y compris pendant les absences commencées avant la période
+        debut, fin = periode if periode is not None else (filtered_cube['date'].min(), filtered_cube['date'].max())
+        capacite_jours = calendrier.capacite(debut, fin, heures_par_tech['technicien'].astype(str),
+                                             calendrier.CalendrierAbsences(absences_chevauchantes(debut, fin)))
 
-        heures_par_tech['moy_heures_jour'] = heures_par_tech['main_oeuvre_heures'] / jours_ouvres
+        # Moyenne d'heures facturées par jour ouvré de présence
+        jours_presence = capacite_jours.sum().to_numpy() / calendrier.HEURES_JOUR
+        heures_par_tech['moy_heures_jour'] = heures_par_tech['main_oeuvre_heures'] / np.where(
+            jours_presence > 0, jours_presence, np.nan)
 
-        fig = px.bar(
-            heures_par_tech,
-            x='technicien',
-            y='moy_heures_jour',
-            title="Heures facturées en moyenne par jour ouvré",
-            labels={'moy_heures_jour': 'Heures facturées/jour', 'technicien': 'Technicien'},
-            text_auto='.1f'
-        )
+        # Objectif de 7h facturées par jour
+        fig = figure(figure_productivite, heures_par_tech, objectif=calendrier.HEURES_JOUR)
 
-        # Ajouter une ligne pour l'objectif (par exemple 7h par jour)
-        fig.add_shape(
-            type="line",
-            x0=-0.5,
-            y0=7,
-            x1=len(heures_par_tech) - 0.5,
-            y1=7,
-            line=dict(color="red", width=2, dash="dash"),
-        )
+        st.plotly_chart(fig, use_container_width=True, key='productivite_personnel')
 
-        fig.add_annotation(
-            x=len(heures_par_tech) / 2,
-            y=7.2,
-            text="Objectif",
-            showarrow=False,
-            font=dict(color="red")
-        )
+        # Taux d'utilisation : heures facturées / heures disponibles, par technicien et par période
+        taux_utilisation = calendrier.utilisation(filtered_cube, capacite_jours, granularite)
+        taux_utilisation['utilisation'] *= 100
 
-        st.plotly_chart(fig, use_container_width=True, key='productivite_personnel')
+        fig = figure(
+            px.line,
+            taux_utilisation,
+            x='période',
+            y='utilisation',
+            color='technicien',
+            markers=True,
+            title=f"Taux d'utilisation par {granularite.lower()}",
+            labels={'utilisation': 'Utilisation (%)', 'période': 'Période', 'technicien': 'Technicien'}
+        )
+        st.plotly_chart(fig, use_container_width=True, key='utilisation_personnel')
     else:
         st.info("Aucune donnée de prestations disponible pour la période sélectionnée")
 
-with tab5:
+
+# Fenêtre de dates affichée par une courbe : toute la série par défaut, réduite avec le curseur de zoom
+def zoom_periode(cle, dates):
+    debut, fin = dates.iloc[0].date(), dates.iloc[-1].date()
+    if debut == fin:
+        return debut, fin
+    # Le zoom est propre à l'étendue de la série : il repart de la série entière quand la période change
+    return st.slider("Zoom", min_value=debut, max_value=fin, value=(debut, fin), format="DD/MM/YYYY",
+                     key=f'{cle}_{debut}_{fin}')
+
+
+# Mention des points retirés d'une courbe réduite
+def legende_reduction(nb_points, nb_lignes):
+    if nb_points < nb_lignes:
+        st.caption(f"{nb_points} points affichés sur {nb_lignes} : zoomer pour voir la série complète.")
+
+
+# CA quotidien et moyenne mobile sur 7 jours sur un même graphique
+def figure_ca_quotidien(points):
+    fig = px.line(
+        points,
+        x='date',
+        y=['montant_total_ttc', 'moyenne_mobile_7j'],
+        title="Évolution du CA quotidien et tendance",
+        labels={'value': 'Montant (€)', 'date': 'Date', 'variable': ''},
+        color_discrete_map={
+            'montant_total_ttc': 'lightblue',
+            'moyenne_mobile_7j': 'darkblue'
+        }
+    )
+
+    fig.update_layout(hovermode="x unified")
+    return fig
+
+
+# Évolution du CA quotidien et de sa moyenne mobile sur 7 jours. Fragment : zoomer ne relance que ce graphique.
+# La moyenne mobile est calculée sur la série entière ; la fenêtre zoomée en est une tranche à pleine résolution,
+# réduite par LTTB seulement si elle dépasse le nombre de points d'une courbe.
+@st.fragment
+def courbe_ca_quotidien(ca_daily):
+    visible = filtres.tranche_periode(ca_daily, *zoom_periode('zoom_ca_quotidien', ca_daily['date']))
+    points = affichage.reduire_courbe(visible, 'date', ['montant_total_ttc', 'moyenne_mobile_7j'])
+
+    fig = figure(figure_ca_quotidien, points)
+    st.plotly_chart(fig, use_container_width=True, key='évolution_ca_temps')
+    legende_reduction(len(points), len(visible))
+
+
+# Onglet Analyses avancées
+def onglet_analyses_avancees():
     st.header("Analyses avancées")
 
+    # Toutes les analyses de l'onglet sont calculées une seule fois par sélection, puis seulement rendues
+    avancees = cache_selections(version_donnees).obtenir(
+        ('analyses_avancees', version_donnees, periode, tuple(selections.values())),
+        lambda: analyses.analyses_avancees(filtered_cube, filtered_charges)
+    )
+
     # Performance par type de véhicule et type de prestation
     st.subheader("Performance par type de véhicule et type de prestation")
 
-    if not filtered_prestations.empty:
+    if avancees['matrice_rentabilite'] is not None:
         # Création d'une heatmap pour voir les prestations les plus rentables par type de véhicule
-        perf_matrix = filtered_prestations.pivot_table(
-            index='type_vehicule',
-            columns='type_prestation',
-            values='marge_totale',
-            aggfunc='mean'
-        ).fillna(0)
-
-        fig = px.imshow(
-            perf_matrix,
+        fig = figure(
+            px.imshow,
+            avancees['matrice_rentabilite'],
             labels=dict(x="Type de prestation", y="Type de véhicule", color="Marge moyenne (€)"),
             text_auto='.0f',
             aspect="auto",
@@ -782,11 +964,9 @@ with tab5:
         st.plotly_chart(fig, use_container_width=True, key='heatmap_rentabilite')
 
         # Temps moyen par type de prestation
-        temps_moyen = filtered_prestations.groupby('type_prestation')['main_oeuvre_heures'].mean().reset_index()
-        temps_moyen.sort_values('main_oeuvre_heures', ascending=False, inplace=True)
-
-        fig = px.bar(
-            temps_moyen,
+        fig = figure(
+            px.bar,
+            avancees['temps_moyen'],
             x='type_prestation',
             y='main_oeuvre_heures',
             title="Temps moyen par type de prestation",
@@ -804,17 +984,11 @@ with tab5:
     col1, col2 = st.columns(2)
 
     with col1:
-        if not filtered_prestations.empty:
-            # Calcul du ratio de rentabilité (marge / heures)
-            filtered_prestations['rentabilite_horaire'] = filtered_prestations['marge_totale'] / filtered_prestations[
-                'main_oeuvre_heures']
-
-            rentabilite_prestation = filtered_prestations.groupby('type_prestation')[
-                'rentabilite_horaire'].mean().reset_index()
-            rentabilite_prestation.sort_values('rentabilite_horaire', ascending=False, inplace=True)
-
-            fig = px.bar(
-                rentabilite_prestation,
+        if avancees['rentabilite_prestation'] is not None:
+            # Ratio de rentabilité (marge / heures), moyenne par prestation
+            fig = figure(
+                px.bar,
+                avancees['rentabilite_prestation'],
                 x='type_prestation',
                 y='rentabilite_horaire',
                 title="Rentabilité horaire par type de prestation",
@@ -827,27 +1001,15 @@ with tab5:
             st.info("Aucune donnée de prestations disponible pour la période sélectionnée")
 
     with col2:
-        if not filtered_prestations.empty and not filtered_charges.empty:
-            # Calcul du point mort
-            ca_total = filtered_prestations['montant_total_ttc'].sum()
-            charges_totales = filtered_charges['montant'].sum()
+        if avancees['point_mort'] is not None:
+            # Point mort (combien de jours pour couvrir les charges)
+            point_mort = avancees['point_mort']
 
-            # Calculer le CA journalier moyen
-            jours_periode = (filtered_prestations['date'].max() - filtered_prestations['date'].min()).days + 1
-            ca_journalier = ca_total / jours_periode if jours_periode > 0 else 0
+            st.metric("CA journalier moyen", f"{point_mort['ca_journalier']:.2f} €")
+            st.metric("Charges journalières moyennes", f"{point_mort['charges_journalieres']:.2f} €")
 
-            # Calculer les charges journalières
-            charges_journalieres = charges_totales / jours_periode if jours_periode > 0 else 0
-
-            # Point mort en jours (combien de jours pour couvrir les charges)
-            point_mort_jours = charges_totales / ca_journalier if ca_journalier > 0 else float('inf')
-
-            # Afficher le résultat
-            st.metric("CA journalier moyen", f"{ca_journalier:.2f} €")
-            st.metric("Charges journalières moyennes", f"{charges_journalieres:.2f} €")
-
-            if point_mort_jours != float('inf'):
-                st.metric("Point mort", f"{point_mort_jours:.1f} jours de travail")
+            if point_mort['point_mort_jours'] != float('inf'):
+                st.metric("Point mort", f"{point_mort['point_mort_jours']:.1f} jours de travail")
             else:
                 st.error("Point mort non calculable (CA journalier nul)")
         else:
@@ -856,47 +1018,13 @@ with tab5:
     # Prévisions et tendances
     st.subheader("Prévisions et tendances")
 
-    if not filtered_prestations.empty:
-        # Évolution du CA au fil du temps
-        ca_daily = filtered_prestations.groupby(filtered_prestations['date'])['montant_total_ttc'].sum().reset_index()
-        ca_daily.sort_values('date', inplace=True)
-
-        # Calculer la moyenne mobile sur 7 jours
-        ca_daily['moyenne_mobile_7j'] = ca_daily['montant_total_ttc'].rolling(window=7, min_periods=1).mean()
-
-        fig = px.line(
-            ca_daily,
-            x='date',
-            y=['montant_total_ttc', 'moyenne_mobile_7j'],
-            title="Évolution du CA quotidien et tendance",
-            labels={'value': 'Montant (€)', 'date': 'Date', 'variable': ''},
-            color_discrete_map={
-                'montant_total_ttc': 'lightblue',
-                'moyenne_mobile_7j': 'darkblue'
-            }
-        )
-
-        fig.update_layout(hovermode="x unified")
-        st.plotly_chart(fig, use_container_width=True, key='évolution_ca_temps')
+    if avancees['ca_quotidien'] is not None:
+        courbe_ca_quotidien(avancees['ca_quotidien'])
 
         # Analyse de saisonnalité par jour de la semaine
-        ca_daily['jour_semaine'] = ca_daily['date'].dt.day_name()
-
-        # Ordre des jours de la semaine
-        jours_ordre = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        jours_fr = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-
-        mapping_jours = dict(zip(jours_ordre, jours_fr))
-        ca_daily['jour_semaine_fr'] = ca_daily['jour_semaine'].map(mapping_jours)
-
-        ca_jour_semaine = ca_daily.groupby('jour_semaine_fr')['montant_total_ttc'].mean().reset_index()
-
-        # Réordonner les jours de la semaine
-        ca_jour_semaine['ordre'] = ca_jour_semaine['jour_semaine_fr'].map(dict(zip(jours_fr, range(7))))
-        ca_jour_semaine.sort_values('ordre', inplace=True)
-
-        fig = px.bar(
-            ca_jour_semaine,
+        fig = figure(
+            px.bar,
+            avancees['ca_jour_semaine'],
             x='jour_semaine_fr',
             y='montant_total_ttc',
             title="CA moyen par jour de la semaine",
@@ -913,43 +1041,24 @@ with tab5:
 
     col1, col2, col3 = st.columns(3)
 
-    if not filtered_prestations.empty:
+    if avancees['indicateurs'] is not None:
+        indicateurs = avancees['indicateurs']
+
         with col1:
             # Taux de conversion horaire (combien rapporte une heure facturée en moyenne)
-            taux_conversion = filtered_prestations['montant_total_ttc'].sum() / filtered_prestations[
-                'main_oeuvre_heures'].sum() if filtered_prestations['main_oeuvre_heures'].sum() > 0 else 0
-            st.metric("Taux horaire moyen facturé", f"{taux_conversion:.2f} €/h")
-
-            # Montant moyen par prestation
-            montant_moyen = filtered_prestations['montant_total_ttc'].mean()
-            st.metric("Montant moyen par prestation", f"{montant_moyen:.2f} €")
+            st.metric("Taux horaire moyen facturé", f"{indicateurs['taux_conversion']:.2f} €/h")
+            st.metric("Montant moyen par prestation", f"{indicateurs['montant_moyen']:.2f} €")
 
         with col2:
-            # Ratio pièces/main d'œuvre
-            ratio_pieces_mo = filtered_prestations['montant_pieces'].sum() / filtered_prestations[
-                'montant_main_oeuvre'].sum() if filtered_prestations['montant_main_oeuvre'].sum() > 0 else 0
-            st.metric("Ratio pièces/main d'œuvre", f"{ratio_pieces_mo:.2f}")
-
-            # Marge moyenne par prestation
-            marge_moyenne = filtered_prestations['marge_totale'].mean()
-            st.metric("Marge moyenne par prestation", f"{marge_moyenne:.2f} €")
+            st.metric("Ratio pièces/main d'œuvre", f"{indicateurs['ratio_pieces_mo']:.2f}")
+            st.metric("Marge moyenne par prestation", f"{indicateurs['marge_moyenne']:.2f} €")
 
         with col3:
-            # Nombre de prestations par jour
-            nb_jours = len(filtered_prestations['date'].dt.date.unique())
-            prestations_par_jour = len(filtered_prestations) / nb_jours if nb_jours > 0 else 0
-            st.metric("Prestations par jour", f"{prestations_par_jour:.1f}")
+            st.metric("Prestations par jour", f"{indicateurs['prestations_par_jour']:.1f}")
 
-            # Délai moyen entre prestations (pour les clients réguliers)
-            if len(filtered_prestations) > 10:  # Seulement si assez de données
-                # Simuler un ID client pour l'exemple (en réalité il faudrait avoir cette donnée)
-                filtered_prestations['client_id'] = np.random.randint(1, 100, size=len(filtered_prestations))
-
-                # Compter les clients avec plus d'une prestation
-                clients_count = filtered_prestations.groupby('client_id').size()
-                clients_reguliers = clients_count[clients_count > 1].count()
-
-                st.metric("Clients réguliers", f"{clients_reguliers}")
+            # Clients réguliers, seulement si assez de données
+            if indicateurs['clients_reguliers'] is not None:
+                st.metric("Clients réguliers", f"{indicateurs['clients_reguliers']}")
             else:
                 st.info("Données insuffisantes pour certains KPIs")
     else:
@@ -958,75 +1067,26 @@ with tab5:
     # Recommandations automatiques
     st.subheader("Recommandations")
 
-    if not filtered_prestations.empty and not filtered_charges.empty:
-        recommandations = []
-
-        # Analyse des prestations les plus rentables
-        prestations_rentables = filtered_prestations.groupby('type_prestation')[
-            'rentabilite_horaire'].mean().sort_values(ascending=False)
-        prestations_populaires = filtered_prestations.groupby('type_prestation').size().sort_values(ascending=False)
-
-        # Identifier les prestations rentables mais peu populaires
-        top_rentables = set(prestations_rentables.head(3).index)
-        top_populaires = set(prestations_populaires.head(3).index)
-
-        opportunites = top_rentables - top_populaires
-        if opportunites:
-            recommandations.append(
-                f"Opportunité: Les prestations {', '.join(opportunites)} sont très rentables mais peu fréquentes. Considérez des actions marketing pour ces services.")
-
-        # Analyse des techniciens
-        tech_perf = filtered_prestations.groupby('technicien')['marge_totale'].sum().sort_values()
-        if len(tech_perf) >= 3:
-            least_performing = tech_perf.index[0]
-            recommandations.append(
-                f"Formation: {least_performing} génère moins de marge que les autres techniciens. Envisagez une formation ou un accompagnement.")
-
-        # Analyse des charges
-        charges_elevees = filtered_charges.groupby('type')['montant'].sum().sort_values(ascending=False).head(1)
-        if not charges_elevees.empty:
-            top_charge = charges_elevees.index[0]
-            recommandations.append(
-                f"Optimisation des coûts: {top_charge} représente une part importante des charges. Examinez les possibilités de réduction.")
-
-        # Analyse saisonnière
-        if 'ca_jour_semaine' in locals():
-            jours_faibles = ca_jour_semaine.sort_values('montant_total_ttc').iloc[0]['jour_semaine_fr']
-            recommandations.append(
-                f"Activité: Le {jours_faibles} est généralement le jour le moins actif. Envisagez des promotions spéciales pour ce jour.")
-
-        # Afficher les recommandations
-        if recommandations:
-            for i, rec in enumerate(recommandations, 1):
+    if avancees['recommandations'] is not None:
+        if avancees['recommandations']:
+            for i, rec in enumerate(avancees['recommandations'], 1):
                 st.info(f"{i}. {rec}")
         else:
             st.success("Pas de recommandations spécifiques pour la période sélectionnée.")
     else:
         st.info("Données insuffisantes pour générer des recommandations")
-        
-with tab6:
-
-    # Initialisation des données si elles ne sont pas déjà chargées
-    def generate_sample_data():
-        # Données par défaut pour les bonus
-        if 'bonus' not in st.session_state:
-            st.session_state.bonus = pd.DataFrame({
-                'id_bonus': [],
-                'date': [],
-                'amount': [],
-                'description': []
-            })
 
-        return {
-            'bonus': st.session_state.bonus
-        }
 
-    # Charger les données si elles existent, sinon générer des données par défaut
-    data = generate_sample_data()
+# Bonus du registre partagé, relus uniquement après un ajout (la version est le dernier identifiant attribué)
+@st.cache_data(max_entries=2)
+def charger_bonus(version):
+    return registre_bonus.lister()
 
-    # Interface utilisateur principale
-    st.title("Gestion des Bonus")
 
+# Saisie et analyse des bonus. Fragment : un clic sur « Ajouter le Bonus » ne relance que cette partie de la page,
+# pas les filtres ni les graphiques des autres onglets
+@st.fragment
+def gestion_bonus():
     # Section pour ajouter de nouveaux bonus
     with st.expander("Ajouter un Bonus"):
         col1, col2 = st.columns(2)
@@ -1039,21 +1099,11 @@ with tab6:
             new_description = st.text_input("Description du Bonus")
 
         if st.button("Ajouter le Bonus"):
-            # Ajout des données dans le DataFrame
-            data['bonus'] = pd.concat([
-                data['bonus'],
-                pd.DataFrame({
-                    'id_bonus': [len(data['bonus']) + 1],
-                    'date': [new_date],
-                    'amount': [new_amount],
-                    'description': [new_description]
-                })
-            ])
-
-            # Sauvegarde dans le fichier CSV
-            st.session_state.bonus = data['bonus']
+            registre_bonus.ajouter(new_date, new_amount, new_description)
             st.success("Bonus ajouté avec succès !")
 
+    bonus = charger_bonus(registre_bonus.version())
+
     # Section pour visualiser les bonus existants
     with st.expander("Analyse des Bonus"):
         col1, col2 = st.columns(2)
@@ -1061,19 +1111,16 @@ with tab6:
         # Graphique de l'évolution des bonus au fil du temps
         with col1:
             st.subheader("Évolution des bonus")
-            if not data['bonus'].empty:
-                fig = px.line(data['bonus'], x='date', y='amount',
-                              title="Montant des bonus au fil du temps",
-                              labels={'x': 'Date', 'y': 'Montant'})
-                st.plotly_chart(fig)
+            if not bonus.empty:
+                courbe_bonus(bonus)
             else:
                 st.info("Aucun bonus enregistré pour l'instant.")
 
         # Tableau des bonus
         with col2:
             st.subheader("Liste des bonus")
-            if not data['bonus'].empty:
-                st.dataframe(data['bonus'],
+            if not bonus.empty:
+                st.dataframe(affichage.vue_arrow(bonus),
                              column_config={
                                  'id_bonus': {'visible': False},
                                  'date': {'label': 'Date'},
@@ -1083,32 +1130,56 @@ with tab6:
             else:
                 st.info("Aucun bonus enregistré pour l'instant.")
 
-    # Interface utilisateur pour filtrer les bonus par période
+    total_bonus_periode()
+
+    # Interface utilisateur pour générer un rapport au format PDF
+    with st.expander("Générer un Rapport"):
+        if not bonus.empty:
+            # Code pour générer le rapport (à implémenter selon vos besoins)
+            st.info("Cliquez ici pour générer un rapport au format PDF.")
+        else:
+            st.warning("Aucun bonus enregistré pour générer un rapport.")
+
+
+# Montants des bonus au fil du temps, réduits par LTTB au-delà du nombre de points d'une courbe.
+# Fragment imbriqué : zoomer ne relance que ce graphique, sur les bonus de la fenêtre à pleine résolution.
+@st.fragment
+def courbe_bonus(bonus):
+    visible = filtres.tranche_periode(bonus, *zoom_periode('zoom_bonus', bonus['date']))
+    points = affichage.reduire_courbe(visible, 'date', ['amount'])
+
+    fig = figure(px.line, points, x='date', y='amount',
+                 title="Montant des bonus au fil du temps",
+                 labels={'x': 'Date', 'y': 'Montant'})
+    st.plotly_chart(fig)
+    legende_reduction(len(points), len(visible))
+
+
+# Total des bonus sur une période. Fragment imbriqué : changer les dates ne relance que ce calcul,
+# une requête SUM sur l'index de date du registre
+@st.fragment
+def total_bonus_periode():
     st.subheader("Calcul du Total des Bonus selon la Période")
     start_date = st.date_input("Date de Début", date.today())
     end_date = st.date_input("Date de Fin", date.today())
 
     if start_date <= end_date:
-        filtered_bonus = data['bonus'][
-            (data['bonus']['date'] >= start_date) &
-            (data['bonus']['date'] <= end_date)
-            ]
+        nb_bonus, total_amount = registre_bonus.total_periode(start_date, end_date)
 
-        if not filtered_bonus.empty:
-            total_amount = filtered_bonus['amount'].sum()
+        if nb_bonus:
             st.write(f"Montant Total du Bonus pour la période : **{total_amount}**")
         else:
             st.warning("Aucun bonus trouvé pour cette période.")
     else:
         st.warning("La date de fin doit être supérieure ou égale à la date de début.")
 
-    # Interface utilisateur pour générer un rapport au format PDF
-    with st.expander("Générer un Rapport"):
-        if not data['bonus'].empty:
-            # Code pour générer le rapport (à implémenter selon vos besoins)
-            st.info("Cliquez ici pour générer un rapport au format PDF.")
-        else:
-            st.warning("Aucun bonus enregistré pour générer un rapport.")
+
+# Onglet Bonus : saisie, analyse et total par période
+def onglet_bonus():
+    # Interface utilisateur principale
+    st.title("Gestion des Bonus")
+
+    gestion_bonus()
 
     # Informations complémentaires
     with st.expander("Informations sur les Bonus"):
@@ -1120,254 +1191,21 @@ with tab6:
         """)
 
 
-# Ajouter un pied de page
-st.markdown("---")
-st.markdown("© 2024 Dashboard de Suivi d'Activité - Garage Automobile")
+# Organisation en onglets : changer d'onglet relance le script et seul l'onglet ouvert est calculé et affiché,
+# les autres ne produisent ni calcul ni graphique
+ONGLETS = {
+    "📈 Vue d'ensemble": onglet_vue_ensemble,
+    "🔧 Prestations": onglet_prestations,
+    "💰 Finances": onglet_finances,
+    "👥 Personnel": onglet_personnel,
+    "📊 Analyses Avancées": onglet_analyses_avancees,
+    "💵 Bonus": onglet_bonus,
+}
 
-# Performance par type de véhicule et type de prestation
-st.subheader("Performance par type de véhicule et type de prestation")
-
-if not filtered_prestations.empty:
-    # Création d'une heatmap pour voir les prestations les plus rentables par type de véhicule
-    perf_matrix = filtered_prestations.pivot_table(
-        index='type_vehicule',
-        columns='type_prestation',
-        values='marge_totale',
-        aggfunc='mean'
-    ).fillna(0)
-
-    fig = px.imshow(
-        perf_matrix,
-        labels=dict(x="Type de prestation", y="Type de véhicule", color="Marge moyenne (€)"),
-        text_auto='.0f',
-        aspect="auto",
-        title="Marge moyenne par type de véhicule et prestation"
-    )
-
-    st.plotly_chart(fig, use_container_width=True, key='heatmap_rentabilité_vehicule')
-
-    # Temps moyen par type de prestation
-    temps_moyen = filtered_prestations.groupby('type_prestation')['main_oeuvre_heures'].mean().reset_index()
-    temps_moyen.sort_values('main_oeuvre_heures', ascending=False, inplace=True)
-
-    fig = px.bar(
-        temps_moyen,
-        x='type_prestation',
-        y='main_oeuvre_heures',
-        title="Temps moyen par type de prestation",
-        labels={'main_oeuvre_heures': 'Heures de main d\'œuvre', 'type_prestation': 'Type de prestation'},
-        text_auto='.1f'
-    )
-
-    st.plotly_chart(fig, use_container_width=True, key='tps_moyen_type_prestation')
-else:
-    st.info("Aucune donnée disponible pour la période sélectionnée")
-
-# Analyse de rentabilité
-st.subheader("Analyse de rentabilité")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    if not filtered_prestations.empty:
-        # Calcul du ratio de rentabilité (marge / heures)
-        filtered_prestations['rentabilite_horaire'] = filtered_prestations['marge_totale'] / filtered_prestations[
-            'main_oeuvre_heures']
-
-        rentabilite_prestation = filtered_prestations.groupby('type_prestation')[
-            'rentabilite_horaire'].mean().reset_index()
-        rentabilite_prestation.sort_values('rentabilite_horaire', ascending=False, inplace=True)
-
-        fig = px.bar(
-            rentabilite_prestation,
-            x='type_prestation',
-            y='rentabilite_horaire',
-            title="Rentabilité horaire par type de prestation",
-            labels={'rentabilite_horaire': 'Marge par heure (€/h)', 'type_prestation': 'Type de prestation'},
-            text_auto='.0f'
-        )
-
-        st.plotly_chart(fig, use_container_width=True, key='rentabilité_heure')
-    else:
-        st.info("Aucune donnée de prestations disponible pour la période sélectionnée")
-
-with col2:
-    if not filtered_prestations.empty and not filtered_charges.empty:
-        # Calcul du point mort
-        ca_total = filtered_prestations['montant_total_ttc'].sum()
-        charges_totales = filtered_charges['montant'].sum()
-
-        # Calculer le CA journalier moyen
-        jours_periode = (filtered_prestations['date'].max() - filtered_prestations['date'].min()).days + 1
-        ca_journalier = ca_total / jours_periode if jours_periode > 0 else 0
-
-        # Calculer les charges journalières
-        charges_journalieres = charges_totales / jours_periode if jours_periode > 0 else 0
-
-        # Point mort en jours (combien de jours pour couvrir les charges)
-        point_mort_jours = charges_totales / ca_journalier if ca_journalier > 0 else float('inf')
-
-        # Afficher le résultat
-        st.metric("CA journalier moyen", f"{ca_journalier:.2f} €")
-        st.metric("Charges journalières moyennes", f"{charges_journalieres:.2f} €")
-
-        if point_mort_jours != float('inf'):
-            st.metric("Point mort", f"{point_mort_jours:.1f} jours de travail")
-        else:
-            st.error("Point mort non calculable (CA journalier nul)")
-    else:
-        st.info("Données insuffisantes pour la période sélectionnée")
-
-# Prévisions et tendances
-st.subheader("Prévisions et tendances")
-
-if not filtered_prestations.empty:
-    # Évolution du CA au fil du temps
-    ca_daily = filtered_prestations.groupby(filtered_prestations['date'])['montant_total_ttc'].sum().reset_index()
-    ca_daily.sort_values('date', inplace=True)
-
-    # Calculer la moyenne mobile sur 7 jours
-    ca_daily['moyenne_mobile_7j'] = ca_daily['montant_total_ttc'].rolling(window=7, min_periods=1).mean()
-
-    fig = px.line(
-        ca_daily,
-        x='date',
-        y=['montant_total_ttc', 'moyenne_mobile_7j'],
-        title="Évolution du CA quotidien et tendance",
-        labels={'value': 'Montant (€)', 'date': 'Date', 'variable': ''},
-        color_discrete_map={
-            'montant_total_ttc': 'lightblue',
-            'moyenne_mobile_7j': 'darkblue'
-        }
-    )
-
-    fig.update_layout(hovermode="x unified")
-    st.plotly_chart(fig, use_container_width=True, key='prevision_tendance')
-
-    # Analyse de saisonnalité par jour de la semaine
-    ca_daily['jour_semaine'] = ca_daily['date'].dt.day_name()
-
-    # Ordre des jours de la semaine
-    jours_ordre = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    jours_fr = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-
-    mapping_jours = dict(zip(jours_ordre, jours_fr))
-    ca_daily['jour_semaine_fr'] = ca_daily['jour_semaine'].map(mapping_jours)
-
-    ca_jour_semaine = ca_daily.groupby('jour_semaine_fr')['montant_total_ttc'].mean().reset_index()
-
-    # Réordonner les jours de la semaine
-    ca_jour_semaine['ordre'] = ca_jour_semaine['jour_semaine_fr'].map(dict(zip(jours_fr, range(7))))
-    ca_jour_semaine.sort_values('ordre', inplace=True)
-
-    fig = px.bar(
-        ca_jour_semaine,
-        x='jour_semaine_fr',
-        y='montant_total_ttc',
-        title="CA moyen par jour de la semaine",
-        labels={'montant_total_ttc': 'CA moyen (€)', 'jour_semaine_fr': 'Jour de la semaine'},
-        text_auto='.0f'
-    )
-
-    st.plotly_chart(fig, use_container_width=True, key='saisonnalite_jour_semaine')
-else:
-    st.info("Aucune donnée de prestations disponible pour la période sélectionnée")
-
-# KPIs avancés
-st.subheader("KPIs et indicateurs clés")
-
-col1, col2, col3 = st.columns(3)
-
-if not filtered_prestations.empty:
-    with col1:
-        # Taux de conversion horaire (combien rapporte une heure facturée en moyenne)
-        taux_conversion = filtered_prestations['montant_total_ttc'].sum() / filtered_prestations[
-            'main_oeuvre_heures'].sum() if filtered_prestations['main_oeuvre_heures'].sum() > 0 else 0
-        st.metric("Taux horaire moyen facturé", f"{taux_conversion:.2f} €/h")
-
-        # Montant moyen par prestation
-        montant_moyen = filtered_prestations['montant_total_ttc'].mean()
-        st.metric("Montant moyen par prestation", f"{montant_moyen:.2f} €")
-
-    with col2:
-        # Ratio pièces/main d'œuvre
-        ratio_pieces_mo = filtered_prestations['montant_pieces'].sum() / filtered_prestations[
-            'montant_main_oeuvre'].sum() if filtered_prestations['montant_main_oeuvre'].sum() > 0 else 0
-        st.metric("Ratio pièces/main d'œuvre", f"{ratio_pieces_mo:.2f}")
-
-        # Marge moyenne par prestation
-        marge_moyenne = filtered_prestations['marge_totale'].mean()
-        st.metric("Marge moyenne par prestation", f"{marge_moyenne:.2f} €")
-
-    with col3:
-        # Nombre de prestations par jour
-        nb_jours = len(filtered_prestations['date'].dt.date.unique())
-        prestations_par_jour = len(filtered_prestations) / nb_jours if nb_jours > 0 else 0
-        st.metric("Prestations par jour", f"{prestations_par_jour:.1f}")
-
-        # Délai moyen entre prestations (pour les clients réguliers)
-        if len(filtered_prestations) > 10:  # Seulement si assez de données
-            # Simuler un ID client pour l'exemple (en réalité il faudrait avoir cette donnée)
-            filtered_prestations['client_id'] = np.random.randint(1, 100, size=len(filtered_prestations))
-
-            # Compter les clients avec plus d'une prestation
-            clients_count = filtered_prestations.groupby('client_id').size()
-            clients_reguliers = clients_count[clients_count > 1].count()
-
-            st.metric("Clients réguliers", f"{clients_reguliers}")
-        else:
-            st.info("Données insuffisantes pour certains KPIs")
-else:
-    st.info("Aucune donnée disponible pour calculer les KPIs")
-
-# Recommandations automatiques
-st.subheader("Recommandations")
-
-if not filtered_prestations.empty and not filtered_charges.empty:
-    recommandations = []
-
-    # Analyse des prestations les plus rentables
-    prestations_rentables = filtered_prestations.groupby('type_prestation')['rentabilite_horaire'].mean().sort_values(
-        ascending=False)
-    prestations_populaires = filtered_prestations.groupby('type_prestation').size().sort_values(ascending=False)
-
-    # Identifier les prestations rentables mais peu populaires
-    top_rentables = set(prestations_rentables.head(3).index)
-    top_populaires = set(prestations_populaires.head(3).index)
-
-    opportunites = top_rentables - top_populaires
-    if opportunites:
-        recommandations.append(
-            f"Opportunité: Les prestations {', '.join(opportunites)} sont très rentables mais peu fréquentes. Considérez des actions marketing pour ces services.")
-
-    # Analyse des techniciens
-    tech_perf = filtered_prestations.groupby('technicien')['marge_totale'].sum().sort_values()
-    if len(tech_perf) >= 3:
-        least_performing = tech_perf.index[0]
-        recommandations.append(
-            f"Formation: {least_performing} génère moins de marge que les autres techniciens. Envisagez une formation ou un accompagnement.")
-
-    # Analyse des charges
-    charges_elevees = filtered_charges.groupby('type')['montant'].sum().sort_values(ascending=False).head(1)
-    if not charges_elevees.empty:
-        top_charge = charges_elevees.index[0]
-        recommandations.append(
-            f"Optimisation des coûts: {top_charge} représente une part importante des charges. Examinez les possibilités de réduction.")
-
-    # Analyse saisonnière
-    if 'ca_jour_semaine' in locals():
-        jours_faibles = ca_jour_semaine.sort_values('montant_total_ttc').iloc[0]['jour_semaine_fr']
-        recommandations.append(
-            f"Activité: Le {jours_faibles} est généralement le jour le moins actif. Envisagez des promotions spéciales pour ce jour.")
-
-    # Afficher les recommandations
-    if recommandations:
-        for i, rec in enumerate(recommandations, 1):
-            st.info(f"{i}. {rec}")
-    else:
-        st.success("Pas de recommandations spécifiques pour la période sélectionnée.")
-else:
-    st.info("Données insuffisantes pour générer des recommandations")
+for onglet, afficher_onglet in zip(st.tabs(list(ONGLETS), key='onglet', on_change='rerun'), ONGLETS.values()):
+    if onglet.open:
+        with onglet:
+            afficher_onglet()
 
 # Ajouter un pied de page
 st.markdown("---")
@@ -1409,4 +1247,17 @@ Cette application  permet une vision complète l'activité du garage avec :
 
 Pour utiliser cette application, il  suffira de remplacer les données fictives par les données réelles en modifiant la fonction `generate_sample_data()` ou en important vos données depuis des fichiers.
 
+Les exports CSV/Excel de la comptabilité et des portails fournisseurs s'importent dans le stockage avec :
+`python importation.py export.csv prestations --colonne "Date facture=date"`
+(`--constante fournisseur=Flauraud` pour un export de portail fournisseur, `--sep`/`--decimal` selon le format).
+
+Un jeu de données fictif de n'importe quelle taille (tests de charge) s'écrit dans le stockage avec :
+`python generation.py --annees 5 --techniciens 12 --prestations-par-jour 2000`
+
+Les temps et la mémoire des calculs des onglets se mesurent hors Streamlit avec :
+`python benchmark.py --tailles 1000 100000 10000000 --sortie resultats.json`
+
+Pour les stockages qui ne tiennent pas en mémoire, le moteur SQL optionnel (`pip install duckdb`) interroge
+directement les fichiers Parquet : `DASHBOARD_MOTEUR=duckdb streamlit run Dashboard_BMA_copie.py`.
+
 """
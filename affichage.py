@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pyarrow as pa
+
+
+# Colonnes du tableau des prestations brutes, colonnes où porte la recherche et nombre de lignes par page
+COLONNES_PRESTATIONS = ['date', 'type_prestation', 'technicien', 'montant_main_oeuvre', 'montant_pieces',
+                        'montant_total_ttc', 'marge_totale']
+COLONNES_RECHERCHE = ['type_prestation', 'technicien', 'type_vehicule', 'client']
+TAILLE_PAGE = 50
+
+# Nombre maximal de points envoyés par courbe : environ deux par pixel d'un graphique en pleine largeur
+# (layout wide). Au-delà, la courbe est réduite par LTTB, sans perte visible de sa forme.
+POINTS_COURBE = int(os.environ.get('DASHBOARD_POINTS_COURBE', 1500))
+
+# Nombre de points à partir duquel une trace scatter est rendue en WebGL (comme le mode 'auto' de plotly.express)
+SEUIL_WEBGL = 1000
+
+
+# Table Arrow d'un DataFrame pour st.dataframe : seules les colonnes demandées sont converties, sans copie
+# pour les colonnes numériques et dates (les buffers NumPy sont repris tels quels) ni sous-DataFrame intermédiaire.
+# Streamlit envoie ensuite la table au navigateur sans repasser par pandas.
+def vue_arrow(df, colonnes=None):
+    return pa.Table.from_pandas(df, columns=colonnes, preserve_index=False)
+
+
+# Clés de tri d'une colonne : les catégories sont classées par libellé, pas par ordre d'apparition
+def _cles_tri(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        rangs = np.argsort(np.argsort(serie.cat.categories.astype(str)))
+        codes = serie.cat.codes.to_numpy()
+        return np.where(codes >= 0, rangs[codes], -1)
+    return serie.to_numpy()
+
+
+# Index de tri des colonnes du tableau : une permutation stable par colonne, calculée une fois par version des données
+def index_tri(df, colonnes=COLONNES_PRESTATIONS):
+    return {colonne: np.argsort(_cles_tri(df[colonne]), kind='stable') for colonne in colonnes}
+
+
+# Lignes (parmi positions) dont une colonne catégorielle contient le texte. La recherche porte sur les libellés
+# des catégories, quelques dizaines de chaînes, puis les lignes sont retenues par leur code.
+def masque_recherche(df, positions, texte, colonnes=COLONNES_RECHERCHE):
+    texte = texte.strip().lower()
+    masque = np.zeros(len(positions), dtype=bool)
+    for colonne in colonnes:
+        libelles = df[colonne].cat.categories.astype(str).str.lower()
+        codes = np.flatnonzero(libelles.str.contains(texte, regex=False))
+        if len(codes):
+            masque |= np.isin(df[colonne].cat.codes.to_numpy()[positions], codes)
+    return masque
+
+
+# Positions dans df des lignes de la sélection qui correspondent à la recherche, dans l'ordre de la colonne de tri.
+# L'ordre vient de l'index de tri : aucun tri n'est refait quand la sélection, la recherche ou la page changent.
+def lignes_triees(df, positions, tri, colonne, croissant=True, recherche=''):
+    if recherche.strip():
+        positions = positions[masque_recherche(df, positions, recherche)]
+
+    retenues = np.zeros(len(df), dtype=bool)
+    retenues[positions] = True
+    ordre = tri[colonne] if croissant else tri[colonne][::-1]
+    return ordre[retenues[ordre]]
+
+
+# Largest-Triangle-Three-Buckets : positions des nb_points points qui conservent la forme de la courbe (x croissant).
+# Le premier et le dernier point sont gardés ; entre les deux, un point par tranche, celui qui forme le plus grand
+# triangle avec le point retenu dans la tranche précédente et la moyenne de la tranche suivante.
+def lttb(x, y, nb_points):
+    n = len(y)
+    if nb_points >= n or nb_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x)
+    x = (x.astype('int64') if x.dtype.kind == 'M' else x).astype(float)
+    y = np.asarray(y, dtype=float)
+    bornes = np.linspace(1, n - 1, nb_points - 1).astype(int)
+
+    positions = np.empty(nb_points, dtype=np.int64)
+    positions[0], positions[-1] = 0, n - 1
+    a = 0
+    for tranche in range(nb_points - 2):
+        debut, fin = bornes[tranche], bornes[tranche + 1]
+        if tranche + 2 < len(bornes):
+            x_suivant = x[fin:bornes[tranche + 2]].mean()
+            y_suivant = y[fin:bornes[tranche + 2]].mean()
+        else:
+            x_suivant, y_suivant = x[n - 1], y[n - 1]
+
+        aires = np.abs((x[a] - x_suivant) * (y[debut:fin] - y[a]) - (x[a] - x[debut:fin]) * (y_suivant - y[a]))
+        a = positions[tranche + 1] = debut + int(np.argmax(aires))
+    return positions
+
+
+# Lignes d'un DataFrame trié sur x à tracer : réunion des points LTTB de chaque colonne, pour que toutes les courbes
+# partagent leurs abscisses. Les séries plus courtes que le budget sont renvoyées entières.
+def reduire_courbe(df, x, colonnes, nb_points=POINTS_COURBE):
+    if len(df) <= nb_points:
+        return df
+    par_colonne = max(3, nb_points // len(colonnes))
+    positions = np.unique(np.concatenate([lttb(df[x].to_numpy(), df[colonne].to_numpy(), par_colonne)
+                                          for colonne in colonnes]))
+    return df.iloc[positions]
+
+
+# Figure dont les traces scatter de plus de SEUIL_WEBGL points sont converties en scattergl (rendu WebGL).
+# Les propriétés sans équivalent WebGL sont ignorées ; la figure est renvoyée telle quelle si rien n'est converti.
+def webgl(fig):
+    if not any(trace.type == 'scatter' and trace.x is not None and len(trace.x) > SEUIL_WEBGL
+               for trace in fig.data):
+        return fig
+
+    traces = []
+    for trace in fig.data:
+        if trace.type == 'scatter' and trace.x is not None and len(trace.x) > SEUIL_WEBGL:
+            proprietes = {cle: valeur for cle, valeur in trace.to_plotly_json().items() if cle != 'type'}
+            trace = go.Scattergl(proprietes, skip_invalid=True)
+        traces.append(trace)
+    return go.Figure(data=traces, layout=fig.layout)
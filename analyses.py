@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+import cube
+import filtres
+import periodes
+
+
+# Calculs des onglets du dashboard, sans dépendance à Streamlit : ils sont appelés par le dashboard et mesurés
+# par benchmark.py sur des jeux de données de toutes tailles.
+JOURS_SEMAINE = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+JOURS_SEMAINE_FR = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+MOIS_FR = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
+
+
+# CA par jour, semaine ISO, mois ou trimestre, avec le libellé de chaque période
+def ca_par_periode(cube_filtre, granularite='Semaine'):
+    return periodes.agreger_periodes(cube_filtre, granularite, ['montant_total_ttc'])
+
+
+# CA, charges et résultat par mois (année et mois), de la première à la dernière date des deux sources, avec
+# le résultat cumulé depuis le début de chaque année. Les deux sources sont empilées puis agrégées en une seule
+# passe sur l'index des périodes mensuelles : janvier 2024 et janvier 2025 restent deux lignes distinctes.
+def ca_charges_mensuels(cube_filtre, charges_filtrees):
+    sources = pd.concat([
+        cube_filtre[['date', 'montant_total_ttc']].rename(columns={'montant_total_ttc': 'CA'}),
+        charges_filtrees[['date', 'montant']].rename(columns={'montant': 'Charges'}),
+    ], ignore_index=True)
+    mensuel = periodes.agreger_periodes(sources, 'Mois', ['CA', 'Charges'])
+
+    mensuel['Résultat'] = mensuel['CA'] - mensuel['Charges']
+    mensuel['annee'] = mensuel['debut'].dt.year
+    mensuel['nom_mois'] = mensuel['debut'].dt.month.map(dict(enumerate(MOIS_FR, 1)))
+    mensuel['Résultat cumulé'] = mensuel.groupby('annee')['Résultat'].cumsum()
+    return mensuel
+
+
+# CA quotidien et sa moyenne mobile sur 7 jours
+def ca_quotidien(cube_filtre):
+    ca_daily = cube.agreger(cube_filtre, 'date', ['montant_total_ttc'])
+    ca_daily.sort_values('date', inplace=True)
+    ca_daily['moyenne_mobile_7j'] = ca_daily['montant_total_ttc'].rolling(window=7, min_periods=1).mean()
+    return ca_daily
+
+
+# CA quotidien moyen par jour de la semaine, du lundi au dimanche
+def ca_par_jour_semaine(ca_daily):
+    jours = ca_daily['date'].dt.day_name().map(dict(zip(JOURS_SEMAINE, JOURS_SEMAINE_FR)))
+    ca_jour_semaine = ca_daily.groupby(jours.rename('jour_semaine_fr'))['montant_total_ttc'].mean().reset_index()
+
+    ca_jour_semaine['ordre'] = ca_jour_semaine['jour_semaine_fr'].map(dict(zip(JOURS_SEMAINE_FR, range(7))))
+    ca_jour_semaine.sort_values('ordre', inplace=True)
+    return ca_jour_semaine
+
+
+# CA et charges journaliers moyens sur la période couverte par le cube, et point mort en jours de travail
+def point_mort(cube_filtre, charges_filtrees):
+    ca_total = cube_filtre['montant_total_ttc'].sum()
+    charges_totales = charges_filtrees['montant'].sum()
+
+    jours_periode = (cube_filtre['date'].max() - cube_filtre['date'].min()).days + 1
+    ca_journalier = ca_total / jours_periode if jours_periode > 0 else 0
+    charges_journalieres = charges_totales / jours_periode if jours_periode > 0 else 0
+
+    # Nombre de jours de CA nécessaires pour couvrir les charges
+    point_mort_jours = charges_totales / ca_journalier if ca_journalier > 0 else float('inf')
+    return {'ca_journalier': ca_journalier, 'charges_journalieres': charges_journalieres,
+            'point_mort_jours': point_mort_jours}
+
+
+# Recommandations automatiques à partir des prestations, des techniciens, des charges et du jour le moins actif
+def recommandations(cube_filtre, charges_filtrees, ca_jour_semaine=None):
+    resultat = []
+    synthese_prestations = cube.agreger(cube_filtre, 'type_prestation', ['rentabilite_horaire', 'nb_prestations'])
+    synthese_prestations = synthese_prestations.set_index(
+        filtres.libelles_valeurs(synthese_prestations['type_prestation']))
+
+    # Prestations parmi les plus rentables mais pas parmi les plus fréquentes
+    prestations_rentables = cube.moyenne(synthese_prestations, 'rentabilite_horaire').sort_values(ascending=False)
+    prestations_populaires = synthese_prestations['nb_prestations'].sort_values(ascending=False)
+
+    top_rentables = set(prestations_rentables.head(3).index)
+    top_populaires = set(prestations_populaires.head(3).index)
+
+    opportunites = top_rentables - top_populaires
+    if opportunites:
+        resultat.append(
+            f"Opportunité: Les prestations {', '.join(opportunites)} sont très rentables mais peu fréquentes. Considérez des actions marketing pour ces services.")
+
+    # Technicien générant le moins de marge
+    tech_perf = cube.agreger(cube_filtre, 'technicien', ['marge_totale'])
+    tech_perf = tech_perf.set_index(filtres.libelles_valeurs(tech_perf['technicien']))['marge_totale'].sort_values()
+    if len(tech_perf) >= 3:
+        least_performing = tech_perf.index[0]
+        resultat.append(
+            f"Formation: {least_performing} génère moins de marge que les autres techniciens. Envisagez une formation ou un accompagnement.")
+
+    # Charge la plus importante
+    charges_elevees = charges_filtrees.groupby('type', observed=True)['montant'].sum().sort_values(ascending=False).head(1)
+    if not charges_elevees.empty:
+        top_charge = charges_elevees.index[0]
+        resultat.append(
+            f"Optimisation des coûts: {top_charge} représente une part importante des charges. Examinez les possibilités de réduction.")
+
+    # Jour de la semaine le moins actif
+    if ca_jour_semaine is not None and not ca_jour_semaine.empty:
+        jours_faibles = ca_jour_semaine.sort_values('montant_total_ttc').iloc[0]['jour_semaine_fr']
+        resultat.append(
+            f"Activité: Le {jours_faibles} est généralement le jour le moins actif. Envisagez des promotions spéciales pour ce jour.")
+
+    return resultat
+
+
+# Temps moyen de main d'œuvre par type de prestation, du plus long au plus court
+def temps_moyen(cube_filtre):
+    resultat = cube.agreger(cube_filtre, 'type_prestation', ['main_oeuvre_heures', 'nb_prestations'])
+    resultat['main_oeuvre_heures'] = cube.moyenne(resultat, 'main_oeuvre_heures')
+    return resultat.sort_values('main_oeuvre_heures', ascending=False)
+
+
+# Rentabilité horaire (marge / heures) moyenne par type de prestation
+def rentabilite_prestation(cube_filtre):
+    resultat = cube.agreger(cube_filtre, 'type_prestation', ['rentabilite_horaire', 'nb_prestations'])
+    resultat['rentabilite_horaire'] = cube.moyenne(resultat, 'rentabilite_horaire')
+    return resultat.sort_values('rentabilite_horaire', ascending=False)
+
+
+# KPIs de la période : taux horaire, montants et marges moyens, ratio pièces / main d'œuvre, activité
+def indicateurs(cube_filtre):
+    nb_prestations = cube_filtre['nb_prestations'].sum()
+    heures = cube_filtre['main_oeuvre_heures'].sum()
+    main_oeuvre = cube_filtre['montant_main_oeuvre'].sum()
+    nb_jours = cube_filtre['date'].nunique()
+
+    clients_reguliers = None
+    if nb_prestations > 10:  # Seulement si assez de données
+        # Simuler un ID client pour l'exemple (en réalité il faudrait avoir cette donnée)
+        client_id = np.random.randint(1, 100, size=nb_prestations)
+        clients_count = pd.Series(client_id).value_counts()
+        clients_reguliers = clients_count[clients_count > 1].count()
+
+    return {
+        'taux_conversion': cube_filtre['montant_total_ttc'].sum() / heures if heures > 0 else 0,
+        'montant_moyen': cube_filtre['montant_total_ttc'].sum() / nb_prestations,
+        'ratio_pieces_mo': cube_filtre['montant_pieces'].sum() / main_oeuvre if main_oeuvre > 0 else 0,
+        'marge_moyenne': cube_filtre['marge_totale'].sum() / nb_prestations,
+        'prestations_par_jour': nb_prestations / nb_jours if nb_jours > 0 else 0,
+        'clients_reguliers': clients_reguliers,
+    }
+
+
+# Résultats de l'onglet Analyses avancées, calculés une seule fois par sélection puis rendus par les vues.
+# Les entrées valent None quand les données de la période ne permettent pas le calcul.
+def analyses_avancees(cube_filtre, charges_filtrees):
+    resultat = dict.fromkeys(['matrice_rentabilite', 'temps_moyen', 'rentabilite_prestation', 'point_mort',
+                              'ca_quotidien', 'ca_jour_semaine', 'indicateurs', 'recommandations'])
+    if cube_filtre.empty:
+        return resultat
+
+    resultat['matrice_rentabilite'] = cube.matrice_moyenne(cube_filtre, 'type_vehicule', 'type_prestation',
+                                                           'marge_totale')
+    resultat['temps_moyen'] = temps_moyen(cube_filtre)
+    resultat['rentabilite_prestation'] = rentabilite_prestation(cube_filtre)
+    resultat['ca_quotidien'] = ca_quotidien(cube_filtre)
+    resultat['ca_jour_semaine'] = ca_par_jour_semaine(resultat['ca_quotidien'])
+    resultat['indicateurs'] = indicateurs(cube_filtre)
+
+    if not charges_filtrees.empty:
+        resultat['point_mort'] = point_mort(cube_filtre, charges_filtrees)
+        resultat['recommandations'] = recommandations(cube_filtre, charges_filtrees, resultat['ca_jour_semaine'])
+    return resultat
@@ -0,0 +1,176 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+import analyses
+import calendrier
+import echeances
+import cube
+import filtres
+import generation
+
+
+# Mesure des calculs du dashboard hors de Streamlit, sur des jeux générés de plusieurs tailles.
+# Pour chaque section : temps d'exécution, pic de mémoire résidente pendant la section et pic des allocations
+# Python/NumPy.
+# Usage : python benchmark.py --tailles 1000 100000 10000000 --sortie resultats.json
+TAILLES = [1_000, 100_000, 10_000_000]
+NB_ANNEES = 3
+
+
+def _version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Pic de mémoire résidente du processus, en Mo (ru_maxrss est en octets sous macOS)
+def _rss_max_mo():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+# Pic de mémoire résidente d'une section, en Mo : ru_maxrss ne fait que croître dans un processus, la section est
+# donc exécutée dans un processus fils (fork) qui partage les données déjà chargées. Le pic du fils part de la
+# mémoire résidente au moment du fork : on renvoie le pic pendant la section et l'écart avec ce point de départ.
+def _rss_section_mo(calcul):
+    lecture, ecriture = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(lecture)
+        depart = _rss_max_mo()
+        calcul()
+        os.write(ecriture, json.dumps([depart, _rss_max_mo()]).encode())
+        os._exit(0)
+
+    os.close(ecriture)
+    with os.fdopen(lecture) as tube:
+        depart, pic = json.loads(tube.read())
+    os.waitpid(pid, 0)
+    return pic, pic - depart
+
+
+# Jeu de données d'environ taille prestations, avec son cube et ses index, tel que chargé par le dashboard
+def preparer(taille, graine=0):
+    jours = pd.date_range(f'{2024 - NB_ANNEES + 1}-01-01', '2024-12-31').size
+    tables = generation.generer_donnees(2024 - NB_ANNEES + 1, NB_ANNEES, prestations_par_jour=taille / jours,
+                                        graine=graine)
+    tables['cube'] = cube.construire_cube(tables['prestations'])
+    index = {'prestations': filtres.construire_index(tables['prestations']),
+             'cube': filtres.construire_index(tables['cube'])}
+    return tables, index
+
+
+# Sections mesurées : chacune reçoit le résultat des filtres de la sidebar (dernière année, deux techniciens)
+def sections(tables, index):
+    techniciens = list(tables['prestations']['technicien'].cat.categories)
+    selections = dict.fromkeys(filtres.COLONNES_FILTRABLES)
+    selections['technicien'] = tuple(techniciens[:2])
+    periode = (pd.Timestamp('2024-01-01'), pd.Timestamp('2024-12-31'))
+
+    def filtrer():
+        return filtres.filtrer({nom: tables[nom] for nom in ('prestations', 'cube', 'charges', 'absences',
+                                                              'fournisseurs')}, index, periode, selections)
+
+    selection = filtrer()
+    cube_filtre, charges_filtrees = selection['cube'], selection['charges']
+    ca_daily = analyses.ca_quotidien(cube_filtre)
+
+    def utilisation():
+        calendrier_absences = calendrier.CalendrierAbsences(calendrier.absences_periode(tables['absences'], *periode))
+        capacite_jours = calendrier.capacite(*periode, selections['technicien'], calendrier_absences)
+        return calendrier.utilisation(cube_filtre, capacite_jours, 'Mois')
+
+    return {
+        'cube': lambda: cube.construire_cube(tables['prestations']),
+        'filtres': filtrer,
+        'ca_hebdomadaire': lambda: analyses.ca_par_periode(cube_filtre, 'Semaine'),
+        'ca_charges_mensuels': lambda: analyses.ca_charges_mensuels(cube_filtre, charges_filtrees),
+        'matrice_rentabilite': lambda: cube.matrice_moyenne(cube_filtre, 'type_vehicule', 'type_prestation',
+                                                            'marge_totale'),
+        'moyenne_mobile_7j': lambda: analyses.ca_quotidien(cube_filtre),
+        'point_mort': lambda: analyses.point_mort(cube_filtre, charges_filtrees),
+        'recommandations': lambda: analyses.recommandations(cube_filtre, charges_filtrees,
+                                                            analyses.ca_par_jour_semaine(ca_daily)),
+        'utilisation': utilisation,
+        'anciennete_fournisseurs': lambda: echeances.anciennete(echeances.echeancier(tables['fournisseurs']),
+                                                                periode[1]),
+        'analyses_avancees': lambda: analyses.analyses_avancees(cube_filtre, charges_filtrees),
+    }
+
+
+# Mesurer une section : meilleur temps sur repetitions exécutions, une exécution dans un processus fils pour le pic
+# de mémoire résidente, puis une exécution sous tracemalloc (qui ralentit les calculs) pour le pic d'allocations
+def mesurer(calcul, repetitions):
+    temps = []
+    for _ in range(repetitions):
+        gc.collect()
+        debut = time.perf_counter()
+        calcul()
+        temps.append(time.perf_counter() - debut)
+
+    gc.collect()
+    rss_max, rss_section = _rss_section_mo(calcul)
+
+    gc.collect()
+    tracemalloc.start()
+    calcul()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'temps_s': min(temps), 'rss_max_mo': round(rss_max, 1), 'rss_section_mo': round(rss_section, 1),
+            'allocations_max_mo': round(pic / 1024 ** 2, 2)}
+
+
+def executer(tailles=TAILLES, repetitions=3, selection_sections=None):
+    resultats = []
+    for taille in tailles:
+        debut = time.perf_counter()
+        tables, index = preparer(taille)
+        print(f"{len(tables['prestations'])} prestations, cube de {len(tables['cube'])} cellules "
+              f"({time.perf_counter() - debut:.1f} s)", file=sys.stderr)
+
+        for nom, calcul in sections(tables, index).items():
+            if selection_sections and nom not in selection_sections:
+                continue
+            mesure = mesurer(calcul, repetitions)
+            resultats.append({'taille': taille, 'prestations': len(tables['prestations']), 'section': nom, **mesure})
+            print(f"  {nom:<20} {mesure['temps_s'] * 1000:10.1f} ms {mesure['allocations_max_mo']:10.1f} Mo",
+                  file=sys.stderr)
+
+        del tables, index
+        gc.collect()
+
+    return {
+        'version': _version(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'resultats': resultats,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mesurer les calculs du dashboard sur des jeux de données générés")
+    parser.add_argument('--tailles', type=int, nargs='+', default=TAILLES)
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--section', action='append', help="Ne mesurer que cette section (répétable)")
+    parser.add_argument('--sortie', help="Fichier JSON des résultats (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    rapport = executer(args.tailles, args.repetitions, args.section)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(rapport, indent=2, ensure_ascii=False))
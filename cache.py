@@ -0,0 +1,95 @@
+import hashlib
+import marshal
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# Taille mémoire approximative d'une valeur mise en cache (DataFrames, tableaux NumPy et leurs conteneurs)
+def taille_memoire(valeur):
+    if isinstance(valeur, pd.DataFrame):
+        return int(valeur.memory_usage(index=True, deep=False).sum())
+    if isinstance(valeur, (pd.Series, pd.Index)):
+        return int(valeur.memory_usage(deep=False))
+    if isinstance(valeur, np.ndarray):
+        return int(valeur.nbytes)
+    if isinstance(valeur, dict):
+        return sum(taille_memoire(v) for v in valeur.values())
+    if isinstance(valeur, (list, tuple)):
+        return sum(taille_memoire(v) for v in valeur)
+    return 0
+
+
+# Empreinte d'une valeur pour les clés de cache : contenu des DataFrames, Series et tableaux NumPy (haché par
+# pandas, sans copie en chaîne), code des fonctions, et récursivement celui des conteneurs
+def empreinte(valeur):
+    hachage = hashlib.sha1()
+    _hacher(hachage, valeur)
+    return hachage.hexdigest()
+
+
+def _hacher(hachage, valeur):
+    hachage.update(type(valeur).__name__.encode())
+    if isinstance(valeur, pd.DataFrame):
+        hachage.update(repr((list(valeur.columns), valeur.index.names, list(valeur.dtypes.astype(str)))).encode())
+        hachage.update(pd.util.hash_pandas_object(valeur, index=True).to_numpy().tobytes())
+    elif isinstance(valeur, pd.Series):
+        hachage.update(repr((valeur.name, str(valeur.dtype))).encode())
+        hachage.update(pd.util.hash_pandas_object(valeur, index=True).to_numpy().tobytes())
+    elif isinstance(valeur, np.ndarray):
+        hachage.update(repr((valeur.dtype, valeur.shape)).encode())
+        hachage.update(np.ascontiguousarray(valeur).tobytes())
+    elif isinstance(valeur, dict):
+        for cle, element in valeur.items():
+            _hacher(hachage, cle)
+            _hacher(hachage, element)
+    elif isinstance(valeur, (list, tuple)):
+        for element in valeur:
+            _hacher(hachage, element)
+    elif callable(valeur) and hasattr(valeur, '__code__'):
+        hachage.update(valeur.__qualname__.encode())
+        hachage.update(marshal.dumps(valeur.__code__))
+    else:
+        hachage.update(repr(valeur).encode())
+
+
+# Cache LRU borné en nombre d'entrées et en mémoire, utilisable depuis plusieurs sessions Streamlit
+class CacheLRU:
+    def __init__(self, max_entrees=32, max_octets=256 * 1024 ** 2):
+        self.max_entrees = max_entrees
+        self.max_octets = max_octets
+        self.octets = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def __len__(self):
+        return len(self._entrees)
+
+    # Valeur associée à la clé, calculée et conservée si absente
+    def obtenir(self, cle, calculer):
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                return self._entrees[cle][0]
+
+        valeur = calculer()
+        taille = taille_memoire(valeur)
+
+        # Une valeur plus grosse que le plafond n'est pas conservée, pour ne pas vider tout le cache
+        if taille > self.max_octets:
+            return valeur
+
+        with self._verrou:
+            if cle not in self._entrees:
+                self._entrees[cle] = (valeur, taille)
+                self.octets += taille
+                self._evincer()
+        return valeur
+
+    # Retirer les entrées les moins récemment utilisées jusqu'à respecter les deux bornes
+    def _evincer(self):
+        while self._entrees and (len(self._entrees) > self.max_entrees or self.octets > self.max_octets):
+            _, (_, taille) = self._entrees.popitem(last=False)
+            self.octets -= taille
@@ -0,0 +1,164 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+import periodes
+
+
+# Heures de travail d'un jour ouvré, et jours fériés en France : dates fixes (mois, jour) et jours définis
+# par leur écart au dimanche de Pâques (lundi de Pâques, Ascension, lundi de Pentecôte)
+HEURES_JOUR = 7
+FERIES_FIXES = [(1, 1), (5, 1), (5, 8), (7, 14), (8, 15), (11, 1), (11, 11), (12, 25)]
+FERIES_PAQUES = [1, 39, 50]
+
+
+# Dates (datetime64[D]) d'un même mois et jour pour chaque année
+def _dates(annees, mois, jour):
+    return ((annees - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (mois - 1)).astype('datetime64[D]') \
+        + (jour - 1)
+
+
+# Dimanche de Pâques de chaque année (calendrier grégorien, algorithme de Meeus/Jones/Butcher), calculé
+# pour toutes les années à la fois
+def paques(annees):
+    annees = np.asarray(annees)
+    a, b, c = annees % 19, annees // 100, annees % 100
+    d, e = b // 4, b % 4
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    l = (32 + 2 * e + 2 * (c // 4) - h - c % 4) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    return _dates(annees, (h + l - 7 * m + 114) // 31, (h + l - 7 * m + 114) % 31 + 1)
+
+
+# Jours fériés des années données
+def jours_feries(annees):
+    annees = np.asarray(annees)
+    fixes = [_dates(annees, mois, jour) for mois, jour in FERIES_FIXES]
+    mobiles = [paques(annees) + ecart for ecart in FERIES_PAQUES]
+    return np.sort(np.concatenate(fixes + mobiles))
+
+
+# Jours de debut à fin (inclus) et, pour chacun, s'il est ouvré : du lundi au vendredi, hors jours fériés
+def jours_ouvres(debut, fin):
+    jours = pd.date_range(pd.Timestamp(debut).normalize(), pd.Timestamp(fin).normalize())
+    feries = jours_feries(np.arange(jours[0].year, jours[-1].year + 1)) if len(jours) else []
+    return jours, np.is_busday(jours.to_numpy().astype('datetime64[D]'), holidays=feries)
+
+
+# Calendrier des absences : matrice d'occupation jour x employé, chaque absence étant étendue sur les duree jours
+# consécutifs à partir de sa date (et non comptée sur son seul premier jour). Une case vaut 0 si l'employé est
+# présent, sinon 1 + le code du type d'absence. La ligne d'un jour se trouve par différence de dates, sans recherche.
+class CalendrierAbsences:
+    def __init__(self, absences):
+        self.noms = list(absences['nom'].cat.categories)
+        self.types = list(absences['type_absence'].cat.categories)
+
+        absences = absences[absences['nom'].cat.codes.to_numpy() >= 0]
+        if absences.empty:
+            self.jours = pd.DatetimeIndex([])
+            self.matrice = np.zeros((0, len(self.noms)), dtype=np.int8)
+            return
+
+        debuts = absences['date'].dt.normalize().to_numpy()
+        duree = np.maximum(absences['duree'].to_numpy(), 1)
+        premier = debuts.min()
+        decalage = (debuts - premier) // np.timedelta64(1, 'D')
+        nb_jours = int((decalage + duree).max())
+        self.jours = pd.date_range(premier, periods=nb_jours)
+
+        # Une ligne par jour d'absence : jour de début + rang du jour dans l'absence
+        rang = np.arange(duree.sum()) - np.repeat(np.cumsum(duree) - duree, duree)
+        lignes = np.repeat(decalage, duree) + rang
+        colonnes = np.repeat(absences['nom'].cat.codes.to_numpy(), duree)
+        valeurs = np.repeat(absences['type_absence'].cat.codes.to_numpy() + 1, duree)
+
+        self.matrice = np.zeros((nb_jours, len(self.noms)), dtype=np.int8)
+        self.matrice[lignes, colonnes] = valeurs
+
+    # Calendrier limité aux jours de debut à fin (inclus) : les absences commencées avant debut n'y comptent que
+    # pour leurs jours dans la période
+    def periode(self, debut, fin):
+        i = self.jours.searchsorted(pd.Timestamp(debut).normalize(), side='left')
+        j = self.jours.searchsorted(pd.Timestamp(fin).normalize(), side='right')
+        limite = copy.copy(self)
+        limite.jours, limite.matrice = self.jours[i:j], self.matrice[i:j]
+        return limite
+
+    # Employés absents un jour donné et type de leur absence
+    def absents(self, jour):
+        if not len(self.jours):
+            return []
+        ligne = (pd.Timestamp(jour).normalize() - self.jours[0]).days
+        if not 0 <= ligne < len(self.jours):
+            return []
+        occupation = self.matrice[ligne]
+        return [(self.noms[colonne], self.types[occupation[colonne] - 1]) for colonne in np.flatnonzero(occupation)]
+
+    # Matrice d'occupation en DataFrame (jours en lignes, employés en colonnes)
+    def occupation(self):
+        return pd.DataFrame(self.matrice, index=self.jours, columns=self.noms)
+
+    # Nombre de jours d'absence par employé, chaque jour n'étant compté qu'une fois
+    def jours_absence(self):
+        return pd.Series((self.matrice > 0).sum(axis=0), index=self.noms, name='jours_absence')
+
+    # Nombre de jours d'absence par type d'absence, chaque jour d'un employé n'étant compté qu'une fois
+    def jours_par_type(self):
+        comptes = np.bincount(self.matrice.ravel(), minlength=len(self.types) + 1)[1:]
+        return pd.Series(comptes, index=self.types, name='jours_absence')
+
+    # Jours avec au moins un absent : date, noms des absents et nombre d'absents
+    def par_jour(self):
+        absents = pd.DataFrame(self.matrice > 0, index=self.jours, columns=self.noms)
+        absents = absents[absents.any(axis=1)]
+        noms = absents.dot(pd.Index(self.noms) + ', ').str.removesuffix(', ')
+        return pd.DataFrame({'date': absents.index, 'absents': noms.to_numpy(),
+                             'nb_absents': absents.sum(axis=1).to_numpy()})
+
+
+# Absences qui couvrent au moins un jour de debut à fin (jours inclus) : une absence commencée avant debut compte
+# encore si ses duree jours vont au-delà, contrairement au filtre de période qui ne retient que les dates de début
+def absences_periode(absences, debut, fin):
+    debuts = absences['date'].dt.normalize().to_numpy()
+    derniers_jours = debuts + (np.maximum(absences['duree'].to_numpy(), 1) - 1).astype('timedelta64[D]')
+    masque = (debuts <= pd.Timestamp(fin).normalize().to_datetime64()) \
+        & (derniers_jours >= pd.Timestamp(debut).normalize().to_datetime64())
+    return absences[masque]
+
+
+# Heures disponibles par jour et par employé de debut à fin : heures_jour les jours ouvrés, 0 les week-ends, jours
+# fériés et jours d'absence. La matrice d'absences est jointe au calendrier ouvré sur les dates et les noms.
+def capacite(debut, fin, noms, calendrier_absences=None, heures_jour=HEURES_JOUR):
+    jours, ouvre = jours_ouvres(debut, fin)
+    heures = np.repeat((ouvre * float(heures_jour))[:, None], len(noms), axis=1)
+
+    if calendrier_absences is not None:
+        absents = calendrier_absences.occupation().reindex(index=jours, columns=list(noms), fill_value=0)
+        heures[absents.to_numpy() > 0] = 0
+
+    return pd.DataFrame(heures, index=jours, columns=list(noms))
+
+
+# Taux d'utilisation par technicien et par période : heures facturées (cube) / heures disponibles (capacité).
+# Les deux sont agrégés sur le même index de périodes puis joints ; le taux est vide sans heures disponibles.
+def utilisation(cube_filtre, capacite_jours, granularite='Mois'):
+    frequence = periodes.GRANULARITES[granularite]
+    disponibles = capacite_jours.groupby(capacite_jours.index.to_period(frequence)).sum()
+
+    facturees = cube_filtre.groupby(['date', 'technicien'], observed=True)['main_oeuvre_heures'].sum()
+    facturees = facturees.groupby([facturees.index.get_level_values('date').to_period(frequence),
+                                   facturees.index.get_level_values('technicien').astype(str)]).sum()
+    facturees = facturees.unstack(fill_value=0).reindex(index=disponibles.index, columns=disponibles.columns,
+                                                         fill_value=0)
+
+    resultat = pd.DataFrame({
+        'heures_facturees': facturees.stack(),
+        'heures_disponibles': disponibles.stack(),
+    }).rename_axis(['periode', 'technicien']).reset_index()
+    resultat.insert(0, 'période', periodes.libelles(pd.PeriodIndex(resultat['periode']), granularite))
+    resultat['utilisation'] = resultat['heures_facturees'] / resultat['heures_disponibles'].where(
+        resultat['heures_disponibles'] > 0)
+    return resultat.drop(columns='periode')
+
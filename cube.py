@@ -0,0 +1,37 @@
+# Cube d'agrégats des prestations : une ligne par jour x type de prestation x technicien x type de véhicule x client.
+# Toutes les mesures sont additives, les moyennes se déduisent en divisant par nb_prestations.
+DIMENSIONS = ['date', 'type_prestation', 'technicien', 'type_vehicule', 'client']
+
+MESURES = ['montant_total_ttc', 'montant_total_ht', 'marge_totale', 'main_oeuvre_heures', 'montant_pieces',
+           'montant_main_oeuvre', 'montant_pieces_fournisseur', 'rentabilite_horaire', 'nb_prestations']
+
+
+# Construire le cube à partir des prestations brutes. Les dimensions vides (client ou technicien non renseigné)
+# forment leurs propres cellules : toutes les prestations restent comptées dans les totaux.
+def construire_cube(prestations):
+    lignes = prestations.assign(
+        date=prestations['date'].dt.normalize(),
+        # Somme des rentabilités horaires de chaque prestation, pour en retrouver la moyenne
+        rentabilite_horaire=prestations['marge_totale'] / prestations['main_oeuvre_heures'],
+        nb_prestations=1
+    )
+    cube = lignes.groupby(DIMENSIONS, observed=True, sort=True, dropna=False)[MESURES].sum().reset_index()
+    return cube.astype({'nb_prestations': 'int64'})
+
+
+# Agréger les cellules du cube selon une ou plusieurs dimensions (y compris les valeurs vides)
+def agreger(cube, dimensions, mesures=MESURES):
+    return cube.groupby(dimensions, observed=True, dropna=False)[list(mesures)].sum().reset_index()
+
+
+# Moyenne par prestation d'une mesure agrégée
+def moyenne(agregat, mesure):
+    return agregat[mesure] / agregat['nb_prestations']
+
+
+# Matrice des moyennes par prestation d'une mesure (lignes x colonnes), 0 pour les combinaisons absentes
+def matrice_moyenne(cube, index, colonnes, mesure):
+    agregat = agreger(cube, [index, colonnes], [mesure, 'nb_prestations'])
+    agregat[mesure] = moyenne(agregat, mesure)
+    return agregat.pivot(index=index, columns=colonnes, values=mesure).fillna(0)
+
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+
+# Échéancier des factures fournisseurs impayées : échéance = date de facture + délai de paiement, tranches
+# d'ancienneté selon le retard à une date de situation. Les tranches sont bornées en jours de retard.
+TRANCHES = ['À échoir', '0-30 jours', '30-60 jours', '60+ jours']
+BORNES_RETARD = [0, 30, 60]
+
+
+# Factures impayées avec leur échéance, triées par échéance : les factures dues entre deux dates sont une tranche
+# contiguë, trouvée par recherche dichotomique
+def echeancier(fournisseurs):
+    impayees = fournisseurs[~fournisseurs['payee'].to_numpy()]
+    echeances = impayees['date'].to_numpy() + impayees['delai_paiement'].to_numpy().astype('timedelta64[D]')
+    ordre = np.argsort(echeances, kind='stable')
+    return impayees.iloc[ordre].assign(echeance=echeances[ordre]).reset_index(drop=True)
+
+
+# Factures de l'échéancier dont l'échéance tombe entre debut et fin (jours inclus)
+def dues_entre(echeancier_impayes, debut, fin):
+    echeances = echeancier_impayes['echeance'].to_numpy()
+    i = echeances.searchsorted(pd.Timestamp(debut).normalize().to_datetime64(), side='left')
+    j = echeances.searchsorted((pd.Timestamp(fin).normalize() + pd.Timedelta(days=1)).to_datetime64(), side='left')
+    return echeancier_impayes.iloc[i:j]
+
+
+# Tranche d'ancienneté de chaque facture à la date de situation : à échoir si l'échéance n'est pas dépassée,
+# sinon selon le nombre de jours de retard
+def tranches(echeancier_impayes, situation):
+    retard = (pd.Timestamp(situation).normalize().to_datetime64() - echeancier_impayes['echeance'].to_numpy()) \
+        // np.timedelta64(1, 'D')
+    codes = np.where(retard <= 0, 0, np.searchsorted(BORNES_RETARD, retard, side='left'))
+    return pd.Categorical.from_codes(codes, categories=TRANCHES)
+
+
+# Montant impayé par fournisseur et par tranche d'ancienneté, toutes les tranches présentes (à 0 si vides)
+def anciennete(echeancier_impayes, situation):
+    tranche = pd.Series(tranches(echeancier_impayes, situation), index=echeancier_impayes.index, name='tranche')
+    par_tranche = echeancier_impayes.groupby([echeancier_impayes['fournisseur'], tranche], observed=False)['montant']
+    return par_tranche.sum().reset_index()
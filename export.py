@@ -0,0 +1,63 @@
+import gzip
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Export des tables du dashboard : le fichier est encodé par lots de lignes (jamais de copie texte complète
+# de la table), uniquement quand l'utilisateur demande le téléchargement.
+TAILLE_LOT = 50_000
+
+# Nombre maximal de lignes d'une feuille Excel (hors ligne d'en-tête)
+LIGNES_MAX_EXCEL = 1_048_575
+
+FORMATS = {
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def _lots(df, taille_lot):
+    for debut in range(0, len(df), taille_lot):
+        yield df.iloc[debut:debut + taille_lot]
+
+
+def _ecrire_csv_gzip(df, fichier, taille_lot):
+    with gzip.GzipFile(fileobj=fichier, mode='wb', compresslevel=6) as archive:
+        archive.write(','.join(map(str, df.columns)).encode() + b'\n')
+        for lot in _lots(df, taille_lot):
+            archive.write(lot.to_csv(index=False, header=False).encode())
+
+
+def _ecrire_parquet(df, fichier, taille_lot):
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(fichier, schema) as ecrivain:
+        for lot in _lots(df, taille_lot):
+            ecrivain.write_table(pa.Table.from_pandas(lot, schema=schema, preserve_index=False))
+
+
+def _ecrire_excel(df, fichier, taille_lot):
+    from openpyxl import Workbook
+
+    if len(df) > LIGNES_MAX_EXCEL:
+        raise ValueError(f"{len(df)} lignes : trop pour une feuille Excel, utiliser CSV ou Parquet")
+
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet()
+    feuille.append([str(colonne) for colonne in df.columns])
+    for lot in _lots(df, taille_lot):
+        for ligne in lot.astype(object).where(lot.notna(), None).itertuples(index=False, name=None):
+            feuille.append(ligne)
+    classeur.save(fichier)
+
+
+ECRIVAINS = {'CSV (gzip)': _ecrire_csv_gzip, 'Parquet': _ecrire_parquet, 'Excel': _ecrire_excel}
+
+
+# Encoder df au format demandé et renvoyer le contenu du fichier
+def encoder(df, format_export, taille_lot=TAILLE_LOT):
+    fichier = io.BytesIO()
+    ECRIVAINS[format_export](df, fichier, taille_lot)
+    return fichier.getvalue()
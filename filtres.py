@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+
+# Colonnes des prestations (et du cube) filtrables depuis la sidebar
+COLONNES_FILTRABLES = ['type_prestation', 'technicien', 'type_vehicule', 'client']
+
+# Option des filtres qui retient les lignes sans valeur (prestation sans client, sans technicien, ...)
+VIDE = '(vide)'
+
+
+# Bornes [i, j[ des lignes comprises entre debut et fin (jours inclus) par recherche dichotomique.
+# Les tables sont triées par date au chargement (stockage.appliquer_types), la colonne sert donc d'index ordonné.
+def bornes_periode(df, debut, fin):
+    dates = df['date'].to_numpy()
+    i = dates.searchsorted(pd.Timestamp(debut).to_datetime64(), side='left')
+    j = dates.searchsorted((pd.Timestamp(fin) + pd.Timedelta(days=1)).to_datetime64(), side='left')
+    return i, j
+
+
+# Tranche de la période sélectionnée : O(log n) et sans copie des lignes, contrairement à un masque booléen
+def tranche_periode(df, debut, fin):
+    i, j = bornes_periode(df, debut, fin)
+    return df.iloc[i:j]
+
+
+# Valeurs proposées par le filtre d'une colonne catégorielle : les valeurs présentes, triées, puis VIDE si des
+# lignes n'ont pas de valeur (lues sur les codes, sans comparer les valeurs manquantes aux chaînes)
+def valeurs_filtre(serie):
+    codes = np.unique(serie.cat.codes.to_numpy())
+    valeurs = sorted(serie.cat.categories[codes[codes >= 0]])
+    return valeurs + [VIDE] if len(codes) and codes[0] < 0 else valeurs
+
+
+# Libellés d'une colonne de dimension pour l'affichage : VIDE à la place des valeurs manquantes
+def libelles_valeurs(serie):
+    return serie.astype(object).fillna(VIDE)
+
+
+# Forme canonique d'une sélection multiple : None quand elle ne filtre rien (vide ou complète)
+def normaliser_selection(selection, valeurs):
+    if not selection or set(selection) >= set(valeurs):
+        return None
+    return tuple(sorted(selection))
+
+
+# Index bitmap d'une colonne catégorielle : un bitset compacté (1 bit par ligne) par valeur, et par VIDE pour les
+# lignes sans valeur. Construit une fois au chargement, il remplace les isin() sur les chaînes à chaque rerun.
+def index_bitmap(serie):
+    codes = serie.cat.codes.to_numpy()
+    index = {valeur: np.packbits(codes == code) for code, valeur in enumerate(serie.cat.categories)}
+    if (codes < 0).any():
+        index[VIDE] = np.packbits(codes < 0)
+    return index
+
+
+def construire_index(df, colonnes=COLONNES_FILTRABLES):
+    return {colonne: index_bitmap(df[colonne]) for colonne in colonnes}
+
+
+# Masque des lignes [i, j[ qui satisfont toutes les sélections : OU des bitmaps des valeurs d'une même colonne,
+# ET entre colonnes. Seuls les octets couvrant la tranche sont combinés puis décompressés.
+def masque_selections(index, selections, i, j):
+    debut, fin = i // 8, (j + 7) // 8
+    resultat = np.full(fin - debut, 0xFF, dtype=np.uint8)
+
+    for colonne, valeurs in selections.items():
+        if valeurs is None:
+            continue
+        bitmaps = [index[colonne][valeur][debut:fin] for valeur in valeurs if valeur in index[colonne]]
+        resultat &= np.bitwise_or.reduce(bitmaps) if bitmaps else 0
+
+    decalage = i - debut * 8
+    return np.unpackbits(resultat)[decalage:decalage + j - i].view(bool)
+
+
+# Appliquer les filtres de la sidebar à toutes les tables.
+# tables contient prestations, cube, charges, absences et fournisseurs ; index les bitmaps de prestations et du cube ;
+# selections associe chaque colonne filtrable à sa sélection normalisée.
+def filtrer(tables, index, periode, selections):
+    filtre_actif = any(valeurs is not None for valeurs in selections.values())
+
+    selection = {}
+    for nom, df in tables.items():
+        i, j = bornes_periode(df, *periode) if periode is not None else (0, len(df))
+        selection[nom] = df.iloc[i:j]
+
+        if nom in index and filtre_actif:
+            selection[nom] = selection[nom][masque_selections(index[nom], selections, i, j)]
+    return selection
@@ -0,0 +1,185 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import registre_bonus
+import stockage
+
+
+# Génération vectorisée de jeux de données fictifs du garage, reproductibles (graine) et à n'importe quelle échelle :
+# données de démonstration du dashboard et jeux de test de charge écrits dans le stockage.
+TYPES_PRESTATION = ['Revision intermediaire', 'Revision generale', 'Freinage',
+                    'Carrosserie', 'Pneus', 'Suspension', 'Geometrie',
+                    'Embrayage', 'Batterie', 'Climatisation', 'Diagnostic', 'Kit Distribution']
+
+TYPES_VEHICULE = ['Citadine', 'Berline', 'SUV', 'Utilitaire', 'Break']
+
+MECANICIENS = ['Saddem', 'Ismail']
+CARROSSIERS = ['Sohaib']
+
+CLIENTS = ['Particulier', 'Entreprise', 'Assurance']
+PROBABILITES_CLIENTS = [0.6, 0.3, 0.1]
+
+# Charges mensuelles et fourchette de leur montant (les autres charges sont entre 100 et 2000 €)
+CHARGES = ['Loyer', 'Électricité', 'Eau', 'Internet', 'Assurance', 'Alarme',
+           'Salaires', 'Charges sociales', 'Fournitures', 'Dette OI',
+           'Publicité', 'Comptabilité', 'Forfait tel', 'Carburant', 'IRP',
+           'Dette Irp', 'SPSAO', 'Renault', 'Flauraud', 'La Cora', 'AD',
+           'Ouest Injection', 'P&P']
+
+FOURCHETTES_CHARGES = {
+    'Salaires': (3800, 5300), 'Charges sociales': (2000, 2500), 'Loyer': (1830, 1950),
+    'Électricité': (190, 350), 'Eau': (50, 150), 'Assurance': (380, 450), 'Alarme': (134, 150),
+    'Comptabilité': (200, 300), 'Flauraud': (1700, 2900), 'Carburant': (320, 400),
+    'Ouest Injection': (1500, 2300), 'P&P': (1000, 1900),
+}
+FOURCHETTE_CHARGES_DEFAUT = (100, 2000)
+
+TYPES_ABSENCE = ['Maladie', 'Congé payé', 'Formation', 'Sans solde']
+
+FOURNISSEURS = ['Flauraud', 'P&P', 'Ouest Injection', 'La Cora AD', 'SPSAO', 'Renault', 'Audi VW']
+
+DESCRIPTIONS_BONUS = ['Prime de rendement', 'Prime exceptionnelle', 'Remise fournisseur', 'Subvention']
+
+# Volume par défaut : environ 1000 prestations sur une année
+PRESTATIONS_PAR_JOUR = 1000 / 366
+
+
+# Techniciens du garage : l'équipe actuelle, complétée par des mécaniciens numérotés
+def techniciens(nb_techniciens):
+    equipe = MECANICIENS + CARROSSIERS
+    noms = equipe[:nb_techniciens] + [f'Technicien {i}' for i in range(len(equipe) + 1, nb_techniciens + 1)]
+    return noms, ['Carrossier' if nom in CARROSSIERS else 'Mécanicien' for nom in noms]
+
+
+def fournisseurs(nb_fournisseurs):
+    return FOURNISSEURS[:nb_fournisseurs] + [
+        f'Fournisseur {i}' for i in range(len(FOURNISSEURS) + 1, nb_fournisseurs + 1)]
+
+
+# Colonne catégorielle tirée au hasard parmi valeurs, construite directement à partir des codes
+def _tirage(rng, valeurs, n, p=None):
+    codes = rng.choice(len(valeurs), n, p=p).astype(np.int32)
+    return pd.Categorical.from_codes(codes, categories=valeurs)
+
+
+# Jour aléatoire de chaque mois, pour des lignes rattachées à un début de mois
+def _jour_du_mois(rng, debuts_mois):
+    jours = (rng.random(len(debuts_mois)) * debuts_mois.days_in_month).astype(np.int64)
+    return debuts_mois + pd.to_timedelta(jours, unit='D')
+
+
+def generer_prestations(rng, jours, prestations_par_jour, noms_techniciens):
+    # Nombre de factures de chaque jour (loi de Poisson) : les dates sortent déjà triées
+    dates = jours.repeat(rng.poisson(prestations_par_jour, len(jours)))
+    n = len(dates)
+
+    prestations = pd.DataFrame({
+        'date': dates,
+        'type_prestation': _tirage(rng, TYPES_PRESTATION, n),
+        'type_vehicule': _tirage(rng, TYPES_VEHICULE, n),
+        'technicien': _tirage(rng, noms_techniciens, n),
+        'main_oeuvre_heures': rng.uniform(0.5, 8, n).round(1),
+        'montant_main_oeuvre': rng.uniform(50, 800, n).round(2),
+        'montant_pieces': rng.uniform(20, 1500, n).round(2),
+        'marge_pieces': rng.uniform(0.1, 0.4, n).round(2),
+        'tva_applicable': np.full(n, 0.2),
+        'client': _tirage(rng, CLIENTS, n, p=PROBABILITES_CLIENTS),
+    })
+    return stockage.completer_prestations(prestations)
+
+
+# Une ligne par mois et par type de charge, montant tiré dans la fourchette du type
+def generer_charges(rng, mois):
+    bornes = np.array([FOURCHETTES_CHARGES.get(charge, FOURCHETTE_CHARGES_DEFAUT) for charge in CHARGES], dtype=float)
+    n = len(mois) * len(CHARGES)
+
+    return pd.DataFrame({
+        'date': mois.repeat(len(CHARGES)),
+        'type': pd.Categorical.from_codes(np.tile(np.arange(len(CHARGES)), len(mois)), categories=CHARGES),
+        'montant': rng.uniform(np.tile(bornes[:, 0], len(mois)), np.tile(bornes[:, 1], len(mois))).round(2),
+        'payee': rng.random(n) < 0.8,
+    })
+
+
+# 0 à 3 absences par technicien et par mois, de 1 à 3 jours chacune
+def generer_absences(rng, mois, noms_techniciens, statuts):
+    nb_absences = rng.integers(0, 4, (len(noms_techniciens), len(mois)))
+    technicien = np.repeat(np.arange(len(noms_techniciens)), len(mois)).repeat(nb_absences.ravel())
+    debuts_mois = pd.DatetimeIndex(np.tile(mois.to_numpy(), len(noms_techniciens))).repeat(nb_absences.ravel())
+    n = len(technicien)
+
+    return pd.DataFrame({
+        'nom': pd.Categorical.from_codes(technicien, categories=noms_techniciens),
+        'date': _jour_du_mois(rng, debuts_mois),
+        'type_absence': _tirage(rng, TYPES_ABSENCE, n),
+        'duree': rng.integers(1, 4, n),
+        'status': pd.Categorical(np.array(statuts)[technicien]),
+    })
+
+
+# 1 à 9 commandes par fournisseur et par mois
+def generer_fournisseurs(rng, mois, noms_fournisseurs):
+    nb_commandes = rng.integers(1, 10, (len(mois), len(noms_fournisseurs)))
+    fournisseur = np.tile(np.arange(len(noms_fournisseurs)), len(mois)).repeat(nb_commandes.ravel())
+    debuts_mois = mois.repeat(len(noms_fournisseurs)).repeat(nb_commandes.ravel())
+    n = len(fournisseur)
+
+    return pd.DataFrame({
+        'date': _jour_du_mois(rng, debuts_mois),
+        'fournisseur': pd.Categorical.from_codes(fournisseur, categories=noms_fournisseurs),
+        'montant': rng.uniform(500, 3000, n).round(2),
+        'payee': rng.random(n) < 0.7,
+        'delai_paiement': rng.choice([30, 45, 60], n),
+    })
+
+
+# 0 à 2 bonus par mois
+def generer_bonus(rng, mois):
+    debuts_mois = mois.repeat(rng.integers(0, 3, len(mois)))
+    n = len(debuts_mois)
+
+    return pd.DataFrame({
+        'id_bonus': np.arange(1, n + 1),
+        'date': _jour_du_mois(rng, debuts_mois),
+        'amount': rng.uniform(100, 1500, n).round(2),
+        'description': np.array(DESCRIPTIONS_BONUS)[rng.integers(0, len(DESCRIPTIONS_BONUS), n)],
+    })
+
+
+# Générer toutes les tables sur nb_annees années à partir de premiere_annee.
+# Les tables sont au schéma du stockage et triées par date, comme si elles étaient chargées depuis les partitions.
+def generer_donnees(premiere_annee=2024, nb_annees=1, nb_techniciens=3, nb_fournisseurs=len(FOURNISSEURS),
+                    prestations_par_jour=PRESTATIONS_PAR_JOUR, graine=0):
+    rng = np.random.default_rng(graine)
+    jours = pd.date_range(f'{premiere_annee}-01-01', f'{premiere_annee + nb_annees - 1}-12-31', freq='D')
+    mois = pd.date_range(jours[0], jours[-1], freq='MS')
+    noms_techniciens, statuts = techniciens(nb_techniciens)
+
+    tables = {
+        'prestations': generer_prestations(rng, jours, prestations_par_jour, noms_techniciens),
+        'charges': generer_charges(rng, mois),
+        'absences': generer_absences(rng, mois, noms_techniciens, statuts),
+        'fournisseurs': generer_fournisseurs(rng, mois, fournisseurs(nb_fournisseurs)),
+        'bonus': generer_bonus(rng, mois),
+    }
+    return {nom: stockage.appliquer_types(nom, df) for nom, df in tables.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Écrire un jeu de données fictif dans le stockage du dashboard")
+    parser.add_argument('--premiere-annee', type=int, default=2024)
+    parser.add_argument('--annees', type=int, default=1)
+    parser.add_argument('--techniciens', type=int, default=3)
+    parser.add_argument('--fournisseurs', type=int, default=len(FOURNISSEURS))
+    parser.add_argument('--prestations-par-jour', type=float, default=PRESTATIONS_PAR_JOUR)
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--racine', default=stockage.DOSSIER_DONNEES)
+    args = parser.parse_args()
+
+    tables = generer_donnees(args.premiere_annee, args.annees, args.techniciens, args.fournisseurs,
+                             args.prestations_par_jour, args.graine)
+    stockage.ecrire_donnees(**{nom: df for nom, df in tables.items() if nom != 'bonus'}, racine=args.racine)
+    registre_bonus.ajouter_lot(tables['bonus'], remplacer=True, chemin=registre_bonus.chemin_registre(args.racine))
+    print(', '.join(f'{len(df)} {nom}' for nom, df in tables.items()) + f' écrites dans {args.racine}')
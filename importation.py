@@ -0,0 +1,166 @@
+import argparse
+import itertools
+import re
+
+import pandas as pd
+
+import registre_bonus
+import stockage
+
+
+# Import des exports comptables et des portails fournisseurs (Flauraud, Renault, P&P, ...) dans le stockage.
+# Les fichiers sont lus par lots de taille fixe : la mémoire utilisée ne dépend pas de la taille du fichier.
+TAILLE_LOT = 100_000
+
+VALEURS_VRAIES = {'true', 'vrai', 'oui', 'yes', '1', 'x', 'payee', 'payée'}
+
+# Dates au format ISO (2024-03-15, éventuellement suivies de l'heure) : l'ordre jour/mois n'y est pas ambigu
+DATE_ISO = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+# Types de lecture des colonnes d'une table : dates et booléens sont lus en texte puis convertis une seule fois
+def _types_lecture(table):
+    types = {}
+    for colonne, type_colonne in stockage.SCHEMAS[table].items():
+        if type_colonne in ('datetime64[ns]', 'bool'):
+            types[colonne] = 'str'
+        elif type_colonne == 'int64':
+            types[colonne] = 'float64'
+        else:
+            types[colonne] = type_colonne
+    return types
+
+
+def _convertir_booleen(serie):
+    if serie.dtype == bool:
+        return serie
+    return serie.astype('str').str.strip().str.lower().isin(VALEURS_VRAIES)
+
+
+# Convertir les dates d'un lot. Un format explicite est appliqué tel quel ; sinon les dates ISO sont lues comme
+# telles et les autres (15/03/2024, ...) jour en premier par défaut, comme dans les exports français.
+def _convertir_dates(dates, format_date, jour_en_premier):
+    if format_date:
+        return pd.to_datetime(dates, format=format_date)
+    renseignees = dates.dropna().astype('str').str.strip()
+    if renseignees.str.match(DATE_ISO).all():
+        return pd.to_datetime(dates, format='ISO8601')
+    return pd.to_datetime(dates, dayfirst=True if jour_en_premier is None else jour_en_premier)
+
+
+# Mettre un lot au schéma de la table : renommage, colonnes constantes, dates et booléens
+def _preparer_lot(lot, table, correspondance, constantes, format_date, jour_en_premier):
+    lot = lot.rename(columns=correspondance)
+    for colonne, valeur in constantes.items():
+        lot[colonne] = valeur
+
+    lot['date'] = _convertir_dates(lot['date'], format_date, jour_en_premier)
+    for colonne, type_colonne in stockage.SCHEMAS[table].items():
+        if type_colonne == 'bool' and colonne in lot:
+            lot[colonne] = _convertir_booleen(lot[colonne])
+    return lot.dropna(subset=['date'])
+
+
+# Lots d'un fichier CSV
+def lire_csv(chemin, table, correspondance=None, sep=',', decimal='.', encoding='utf-8', taille_lot=TAILLE_LOT):
+    correspondance = correspondance or {}
+    inverse = {cible: source for source, cible in correspondance.items()}
+    types = {inverse.get(colonne, colonne): type_colonne for colonne, type_colonne in _types_lecture(table).items()}
+
+    entete = pd.read_csv(chemin, sep=sep, encoding=encoding, nrows=0).columns
+    utiles = [colonne for colonne in entete if correspondance.get(colonne, colonne) in stockage.SCHEMAS[table]]
+
+    yield from pd.read_csv(chemin, sep=sep, decimal=decimal, encoding=encoding, usecols=utiles,
+                           dtype={colonne: types[colonne] for colonne in utiles}, chunksize=taille_lot)
+
+
+# Lots d'un classeur Excel, lu ligne à ligne en mode lecture seule (openpyxl)
+def lire_excel(chemin, table, correspondance=None, feuille=None, taille_lot=TAILLE_LOT):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as erreur:
+        raise ImportError("L'import des fichiers Excel nécessite openpyxl (pip install openpyxl)") from erreur
+
+    correspondance = correspondance or {}
+    classeur = load_workbook(chemin, read_only=True, data_only=True)
+    try:
+        lignes = (classeur[feuille] if feuille else classeur.active).iter_rows(values_only=True)
+        entete = [str(colonne).strip() for colonne in next(lignes)]
+        utiles = [i for i, colonne in enumerate(entete)
+                  if correspondance.get(colonne, colonne) in stockage.SCHEMAS[table]]
+
+        while True:
+            bloc = list(itertools.islice(lignes, taille_lot))
+            if not bloc:
+                break
+            yield pd.DataFrame([[ligne[i] for i in utiles] for ligne in bloc], columns=[entete[i] for i in utiles])
+    finally:
+        classeur.close()
+
+
+# Importer un fichier CSV ou Excel dans une table du stockage, lot par lot.
+# correspondance renomme les colonnes de l'export vers celles du schéma, constantes complète les colonnes absentes
+# (par exemple {'fournisseur': 'Flauraud'} pour un export de portail fournisseur). jour_en_premier ne sert que
+# pour les dates ni ISO ni décrites par format_date (None : jour en premier).
+def importer(chemin, table, correspondance=None, constantes=None, format_date=None, jour_en_premier=None,
+             taille_lot=TAILLE_LOT, racine=stockage.DOSSIER_DONNEES, **options):
+    correspondance = correspondance or {}
+    constantes = constantes or {}
+
+    if str(chemin).lower().endswith(('.xlsx', '.xlsm')):
+        lots = lire_excel(chemin, table, correspondance, taille_lot=taille_lot, **options)
+    else:
+        lots = lire_csv(chemin, table, correspondance, taille_lot=taille_lot, **options)
+
+    nb_lignes = 0
+    mois_touches = set()
+    for lot in lots:
+        lot = _preparer_lot(lot, table, correspondance, constantes, format_date, jour_en_premier)
+        # Les bonus vont dans leur registre, seule source lue par le dashboard
+        if table == 'bonus':
+            nb_lignes += registre_bonus.ajouter_lot(lot, chemin=registre_bonus.chemin_registre(racine))
+            continue
+        lot = stockage.ajouter(table, lot, completer_cube=False, racine=racine)
+        nb_lignes += len(lot)
+        mois_touches.update(stockage.mois_partition(lot))
+
+    # Regrouper les fichiers écrits lot par lot dans chaque mois importé, puis recalculer le cube de ces mois
+    stockage.compacter(table, mois_touches, racine=racine)
+    if table == 'prestations':
+        stockage.reconstruire_cube(mois_touches, racine=racine)
+    return nb_lignes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Importer un export CSV ou Excel dans le stockage du dashboard")
+    parser.add_argument('chemin')
+    parser.add_argument('table', choices=[nom for nom in stockage.SCHEMAS if nom != 'cube'])
+    parser.add_argument('--sep', default=';')
+    parser.add_argument('--decimal', default=',')
+    parser.add_argument('--encoding', default='utf-8')
+    parser.add_argument('--feuille')
+    parser.add_argument('--format-date')
+    ordre_date = parser.add_mutually_exclusive_group()
+    ordre_date.add_argument('--jour-en-premier', dest='jour_en_premier', action='store_true', default=None,
+                            help="Dates non ISO au format jour/mois/année (par défaut)")
+    ordre_date.add_argument('--mois-en-premier', dest='jour_en_premier', action='store_false',
+                            help="Dates non ISO au format mois/jour/année")
+    parser.add_argument('--colonne', action='append', default=[], metavar='SOURCE=CIBLE',
+                        help="Renommer une colonne de l'export")
+    parser.add_argument('--constante', action='append', default=[], metavar='COLONNE=VALEUR',
+                        help="Valeur fixe d'une colonne absente de l'export")
+    parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+    parser.add_argument('--racine', default=stockage.DOSSIER_DONNEES)
+    args = parser.parse_args()
+
+    if str(args.chemin).lower().endswith(('.xlsx', '.xlsm')):
+        options = {'feuille': args.feuille}
+    else:
+        options = {'sep': args.sep, 'decimal': args.decimal, 'encoding': args.encoding}
+
+    nb = importer(args.chemin, args.table,
+                  correspondance=dict(c.split('=', 1) for c in args.colonne),
+                  constantes=dict(c.split('=', 1) for c in args.constante),
+                  format_date=args.format_date, jour_en_premier=args.jour_en_premier,
+                  taille_lot=args.taille_lot, racine=args.racine, **options)
+    print(f"{nb} lignes importées dans {args.table}")
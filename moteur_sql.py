@@ -0,0 +1,122 @@
+import os
+
+import pandas as pd
+
+import filtres
+import stockage
+
+
+# Moteur SQL optionnel (DuckDB) sur le stockage Parquet : les filtres de la sidebar sont traduits en requêtes,
+# DuckDB ne lit que les partitions mensuelles et les colonnes utiles, et seules les lignes retenues reviennent
+# dans Python. Activé avec DASHBOARD_MOTEUR=duckdb, les tables ne sont alors plus chargées en mémoire.
+MOTEUR = os.environ.get('DASHBOARD_MOTEUR', 'pandas')
+
+
+def _importer_duckdb():
+    try:
+        import duckdb
+    except ImportError as erreur:
+        raise ImportError("Le moteur SQL nécessite duckdb (pip install duckdb)") from erreur
+    return duckdb
+
+
+# Le moteur SQL est utilisé s'il est demandé et que le stockage contient des données
+def actif(racine=stockage.DOSSIER_DONNEES):
+    return MOTEUR == 'duckdb' and stockage.stockage_disponible(racine)
+
+
+# Clause WHERE de la période (jours inclus, avec élagage des partitions mensuelles), des sélections multiples
+# et d'une recherche de texte dans des colonnes
+def _conditions(periode, selections, recherche=None, colonnes_recherche=()):
+    conditions, parametres = [], []
+    if periode is not None:
+        debut, fin = pd.Timestamp(periode[0]), pd.Timestamp(periode[1])
+        conditions.append(f'{stockage.CLE_PARTITION} BETWEEN ? AND ? AND date >= ? AND date < ?')
+        parametres += [debut.strftime('%Y-%m'), fin.strftime('%Y-%m'), debut, fin + pd.Timedelta(days=1)]
+
+    # L'option VIDE des filtres retient les lignes sans valeur, qu'un IN ne retrouve jamais
+    for colonne, valeurs in (selections or {}).items():
+        if valeurs is not None:
+            renseignees = [valeur for valeur in valeurs if valeur != filtres.VIDE]
+            alternatives = [f'{colonne} IN ({", ".join("?" * len(renseignees))})'] if renseignees else []
+            if len(renseignees) < len(valeurs):
+                alternatives.append(f'{colonne} IS NULL')
+            conditions.append('(' + ' OR '.join(alternatives) + ')')
+            parametres += renseignees
+
+    if recherche and recherche.strip() and colonnes_recherche:
+        conditions.append('(' + ' OR '.join(f'contains(lower({colonne}), ?)' for colonne in colonnes_recherche) + ')')
+        parametres += [recherche.strip().lower()] * len(colonnes_recherche)
+
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), parametres
+
+
+# Clause ORDER BY d'un ordre (colonne, croissant) : la colonne doit appartenir à la table, la date départage
+def _ordre(nom, ordre):
+    if ordre is None:
+        return 'date'
+    colonne, croissant = ordre
+    if colonne not in stockage.SCHEMAS[nom]:
+        raise ValueError(f"Colonne de tri inconnue pour la table {nom} : {colonne}")
+    return f'{colonne} {"ASC" if croissant else "DESC"}, date'
+
+
+class MoteurSQL:
+    def __init__(self, racine=stockage.DOSSIER_DONNEES):
+        self.racine = racine
+        self._connexion = _importer_duckdb().connect()
+        self.tables = set()
+
+        # Une vue par table du stockage, sur les fichiers Parquet de son manifeste au moment de la création du moteur
+        # (le moteur est recréé quand la version des données change)
+        for nom in stockage.SCHEMAS:
+            fichiers = stockage.fichiers_table(nom, racine)
+            if fichiers:
+                liste = ', '.join("'" + fichier.replace("'", "''") + "'" for fichier in fichiers)
+                self._connexion.execute(
+                    f"CREATE VIEW {nom} AS SELECT * FROM read_parquet([{liste}], hive_partitioning = true)")
+                self.tables.add(nom)
+
+    # Exécuter une requête sur un curseur dédié : le moteur est partagé par toutes les sessions Streamlit
+    def requete(self, sql, parametres=()):
+        return self._connexion.cursor().execute(sql, list(parametres)).df()
+
+    # Dates extrêmes des prestations (lues sur le cube, beaucoup plus petit)
+    def bornes_dates(self):
+        bornes = self.requete('SELECT min(date) AS debut, max(date) AS fin FROM cube')
+        return pd.Timestamp(bornes['debut'].iloc[0]), pd.Timestamp(bornes['fin'].iloc[0])
+
+    # Valeurs distinctes d'une colonne filtrable, triées, puis VIDE si des prestations n'ont pas de valeur
+    def valeurs(self, colonne):
+        valeurs = self.requete(f'SELECT DISTINCT {colonne} FROM cube ORDER BY {colonne} NULLS LAST')[colonne]
+        return valeurs.dropna().tolist() + ([filtres.VIDE] if valeurs.isna().any() else [])
+
+    # Lignes d'une table retenues par la période, les sélections et la recherche, au schéma du stockage et triées
+    # par date. ordre (colonne et sens), limite et decalage ne ramènent qu'une page d'un classement.
+    def selection(self, nom, periode=None, selections=None, ordre=None, limite=None, decalage=0, recherche=None,
+                  colonnes_recherche=()):
+        if nom not in self.tables:
+            return stockage.charger_table(nom, racine=self.racine)
+
+        colonnes = stockage.COLONNES[nom]
+        where, parametres = _conditions(periode, selections if nom in ('prestations', 'cube') else None,
+                                        recherche, colonnes_recherche)
+        sql = f'SELECT {", ".join(colonnes)} FROM {nom}{where} ORDER BY {_ordre(nom, ordre)}'
+        if limite is not None:
+            sql += f' LIMIT {int(limite)} OFFSET {int(decalage)}'
+
+        df = self.requete(sql, parametres)
+        if ordre is None:
+            return stockage.appliquer_types(nom, df)
+        return df.astype({colonne: type_colonne for colonne, type_colonne in stockage.SCHEMAS[nom].items()})
+
+    # Nombre de lignes d'une table retenues par la période, les sélections et la recherche
+    def compter(self, nom, periode=None, selections=None, recherche=None, colonnes_recherche=()):
+        where, parametres = _conditions(periode, selections, recherche, colonnes_recherche)
+        return int(self.requete(f'SELECT count(*) AS n FROM {nom}{where}', parametres)['n'].iloc[0])
+
+    # Même résultat que filtres.filtrer, calculé par DuckDB : cube de la sélection et tables de la période.
+    # Les prestations brutes ne sont pas lues ici, seulement à la demande (onglet Prestations).
+    def filtrer(self, periode, selections):
+        return {nom: self.selection(nom, periode, selections)
+                for nom in ('cube', 'charges', 'absences', 'fournisseurs')}
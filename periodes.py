@@ -0,0 +1,41 @@
+import pandas as pd
+
+
+# Regroupement temporel des graphiques : granularités proposées dans la sidebar et fréquence pandas de chacune.
+# Les semaines sont les semaines ISO (du lundi au dimanche) et portent l'année ISO : la semaine du 30/12/2024 est
+# 2025-S01, elle n'est plus coupée entre deux mois ni confondue avec la semaine 1 d'une autre année.
+GRANULARITES = {'Jour': 'D', 'Semaine': 'W-SUN', 'Mois': 'M', 'Trimestre': 'Q'}
+
+
+# Libellés des périodes, construits colonne par colonne (aucun formatage ligne à ligne)
+def libelles(periodes, granularite):
+    debuts = periodes.start_time
+    if granularite == 'Jour':
+        return debuts.strftime('%Y-%m-%d')
+    if granularite == 'Semaine':
+        iso = debuts.isocalendar()
+        return pd.Index(iso['year'].astype(str) + '-S' + iso['week'].astype(str).str.zfill(2))
+    if granularite == 'Mois':
+        return debuts.year.astype(str) + '-' + debuts.month.astype(str).str.zfill(2)
+    return debuts.year.astype(str) + '-T' + debuts.quarter.astype(str)
+
+
+# Somme des mesures par période : une ligne par période de la première à la dernière date, y compris les périodes
+# sans données (à 0), avec le début de la période et son libellé. Les dates sont d'abord réduites aux jours
+# présents, puis seuls ces jours sont rattachés à leur période.
+def agreger_periodes(df, granularite, mesures, colonne_date='date'):
+    mesures = list(mesures)
+    if df.empty:
+        return pd.DataFrame(columns=['debut', 'période'] + mesures)
+
+    quotidien = df.groupby(df[colonne_date].dt.normalize())[mesures].sum()
+    frequence = GRANULARITES[granularite]
+    par_periode = quotidien.groupby(quotidien.index.to_period(frequence)).sum()
+
+    toutes = pd.period_range(par_periode.index.min(), par_periode.index.max(), freq=frequence)
+    par_periode = par_periode.reindex(toutes, fill_value=0)
+
+    resultat = par_periode.reset_index(drop=True)
+    resultat.insert(0, 'debut', toutes.start_time)
+    resultat.insert(1, 'période', libelles(toutes, granularite))
+    return resultat
@@ -0,0 +1,112 @@
+import contextlib
+import os
+import sqlite3
+
+import pandas as pd
+
+import stockage
+
+
+# Registre des bonus : base SQLite en mode WAL à côté du stockage en colonnes, partagée par toutes les sessions
+# et conservée entre les redémarrages. Les bonus ne sont qu'ajoutés : un ajout est un INSERT, l'identifiant est
+# attribué par SQLite (AUTOINCREMENT, jamais réutilisé) et les totaux par période passent par l'index sur la date.
+# C'est la seule source des bonus : la saisie du dashboard, l'import de fichiers et les jeux générés y écrivent,
+# la table bonus du stockage Parquet n'est plus lue qu'une fois, pour la reprendre dans le registre.
+def chemin_registre(racine=stockage.DOSSIER_DONNEES):
+    return os.path.join(racine, 'bonus.sqlite')
+
+
+CHEMIN_REGISTRE = chemin_registre()
+
+VERSION_SCHEMA = 1
+
+
+@contextlib.contextmanager
+def _connexion(chemin):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    connexion = sqlite3.connect(chemin, timeout=30)
+    try:
+        connexion.execute('PRAGMA journal_mode=WAL')
+        connexion.execute('PRAGMA synchronous=NORMAL')
+        _initialiser(connexion, os.path.dirname(chemin))
+        yield connexion
+        connexion.commit()
+    finally:
+        connexion.close()
+
+
+# Créer la table et son index au premier accès, en reprenant les bonus déjà présents dans le stockage Parquet
+def _initialiser(connexion, racine):
+    if connexion.execute('PRAGMA user_version').fetchone()[0] >= VERSION_SCHEMA:
+        return
+
+    with connexion:
+        connexion.execute("""
+            CREATE TABLE IF NOT EXISTS bonus (
+                id_bonus INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                amount REAL NOT NULL,
+                description TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        connexion.execute('CREATE INDEX IF NOT EXISTS bonus_date ON bonus (date)')
+
+        existants = stockage.charger_table('bonus', racine=racine)
+        connexion.executemany(
+            'INSERT OR IGNORE INTO bonus (id_bonus, date, amount, description) VALUES (?, ?, ?, ?)',
+            zip(existants['id_bonus'].tolist(), existants['date'].dt.strftime('%Y-%m-%d'),
+                existants['amount'].tolist(), existants['description'].fillna('').tolist())
+        )
+        connexion.execute(f'PRAGMA user_version = {VERSION_SCHEMA}')
+
+
+# Enregistrer un bonus et renvoyer son identifiant
+def ajouter(date, montant, description='', chemin=CHEMIN_REGISTRE):
+    with _connexion(chemin) as connexion:
+        curseur = connexion.execute('INSERT INTO bonus (date, amount, description) VALUES (?, ?, ?)',
+                                    (pd.Timestamp(date).strftime('%Y-%m-%d'), float(montant), description or ''))
+        return curseur.lastrowid
+
+
+# Enregistrer un lot de bonus (colonnes date, amount et description facultative) en une transaction et renvoyer
+# le nombre de bonus ajoutés. Les identifiants du lot sont ignorés : ils sont attribués par le registre.
+# remplacer=True supprime d'abord tous les bonus enregistrés (jeu de données généré).
+def ajouter_lot(bonus, remplacer=False, chemin=CHEMIN_REGISTRE):
+    manquantes = [colonne for colonne in ('date', 'amount') if colonne not in bonus]
+    if manquantes:
+        raise ValueError(f"Colonnes manquantes pour la table bonus : {', '.join(manquantes)}")
+
+    descriptions = bonus['description'] if 'description' in bonus else pd.Series('', index=bonus.index)
+    with _connexion(chemin) as connexion:
+        if remplacer:
+            connexion.execute('DELETE FROM bonus')
+        connexion.executemany(
+            'INSERT INTO bonus (date, amount, description) VALUES (?, ?, ?)',
+            zip(pd.to_datetime(bonus['date']).dt.strftime('%Y-%m-%d'), bonus['amount'].astype(float).tolist(),
+                descriptions.fillna('').astype(str).tolist())
+        )
+    return len(bonus)
+
+
+# Version du registre : le dernier identifiant attribué, qui change à chaque ajout (lu sur la clé primaire)
+def version(chemin=CHEMIN_REGISTRE):
+    with _connexion(chemin) as connexion:
+        return connexion.execute('SELECT max(id_bonus) FROM bonus').fetchone()[0]
+
+
+# Tous les bonus, au schéma de la table bonus du stockage et triés par date
+def lister(chemin=CHEMIN_REGISTRE):
+    with _connexion(chemin) as connexion:
+        bonus = pd.read_sql_query('SELECT id_bonus, date, amount, description FROM bonus ORDER BY date, id_bonus',
+                                  connexion)
+    return stockage.appliquer_types('bonus', bonus)
+
+
+# Nombre et montant total des bonus entre debut et fin (jours inclus), calculés par SQLite sur l'index de date
+def total_periode(debut, fin, chemin=CHEMIN_REGISTRE):
+    with _connexion(chemin) as connexion:
+        nombre, total = connexion.execute(
+            'SELECT count(*), coalesce(sum(amount), 0) FROM bonus WHERE date BETWEEN ? AND ?',
+            (pd.Timestamp(debut).strftime('%Y-%m-%d'), pd.Timestamp(fin).strftime('%Y-%m-%d'))
+        ).fetchone()
+    return nombre, total
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+import cube
+
+
+# Stockage en colonnes des données du garage : un dossier par table, une partition Parquet par mois
+# (donnees/prestations/mois=2024-01/part-<uuid>.parquet, ...). Le manifeste de chaque table
+# (donnees/prestations/_manifeste.json) liste les fichiers visibles de chaque mois : les lecteurs ne lisent que
+# ces fichiers, et une écriture ne devient visible qu'au remplacement atomique du manifeste. Un seul processus
+# écrit à la fois dans une table (import, génération) ; le dashboard ne fait que lire.
+DOSSIER_DONNEES = os.environ.get(
+    'DASHBOARD_DONNEES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'donnees')
+)
+
+CLE_PARTITION = 'mois'
+MANIFESTE = '_manifeste.json'
+
+# Nombre de fichiers au-delà duquel une partition alimentée par ajouts successifs est compactée
+FICHIERS_MAX_PARTITION = 16
+
+# Schéma de chaque table : colonnes lues par le dashboard et leur type.
+# Les colonnes à faible cardinalité sont stockées et chargées en dictionnaire (dtype category côté pandas).
+SCHEMAS = {
+    'prestations': {
+        'date': 'datetime64[ns]', 'type_prestation': 'category', 'type_vehicule': 'category',
+        'technicien': 'category', 'main_oeuvre_heures': 'float64', 'montant_main_oeuvre': 'float64',
+        'montant_pieces': 'float64', 'marge_pieces': 'float64', 'tva_applicable': 'float64', 'client': 'category',
+        'montant_pieces_fournisseur': 'float64', 'montant_total_ht': 'float64', 'montant_total_ttc': 'float64',
+        'marge_totale': 'float64',
+    },
+    'charges': {'date': 'datetime64[ns]', 'type': 'category', 'montant': 'float64', 'payee': 'bool'},
+    'absences': {
+        'nom': 'category', 'date': 'datetime64[ns]', 'type_absence': 'category', 'duree': 'int64',
+        'status': 'category',
+    },
+    'fournisseurs': {
+        'date': 'datetime64[ns]', 'fournisseur': 'category', 'montant': 'float64', 'payee': 'bool',
+        'delai_paiement': 'int64',
+    },
+    'bonus': {'id_bonus': 'int64', 'date': 'datetime64[ns]', 'amount': 'float64', 'description': 'str'},
+    'cube': {
+        'date': 'datetime64[ns]', 'type_prestation': 'category', 'technicien': 'category',
+        'type_vehicule': 'category', 'client': 'category',
+        **{mesure: 'float64' for mesure in cube.MESURES if mesure != 'nb_prestations'},
+        'nb_prestations': 'int64',
+    },
+}
+
+COLONNES = {nom: list(schema) for nom, schema in SCHEMAS.items()}
+
+COLONNES_CATEGORIELLES = {
+    nom: [colonne for colonne, type_colonne in schema.items() if type_colonne == 'category']
+    for nom, schema in SCHEMAS.items()
+}
+
+# Colonnes saisies pour une prestation, les autres sont calculées par completer_prestations
+COLONNES_SAISIES_PRESTATIONS = ['date', 'type_prestation', 'type_vehicule', 'technicien', 'main_oeuvre_heures',
+                                'montant_main_oeuvre', 'montant_pieces', 'marge_pieces', 'tva_applicable', 'client']
+
+
+# Calculer les montants dérivés des prestations à partir des colonnes saisies
+def completer_prestations(prestations):
+    prestations = prestations.copy()
+    prestations['montant_pieces_fournisseur'] = prestations['montant_pieces'] / (1 + prestations['marge_pieces'])
+    prestations['montant_total_ht'] = prestations['montant_main_oeuvre'] + prestations['montant_pieces']
+    prestations['montant_total_ttc'] = prestations['montant_total_ht'] * (1 + prestations['tva_applicable'])
+    prestations['marge_totale'] = prestations['montant_main_oeuvre'] * 0.7 + (
+                prestations['montant_pieces'] - prestations['montant_pieces_fournisseur'])
+    return prestations
+
+
+# Appliquer le schéma de la table (types explicites, colonnes catégorielles) et trier par date
+def appliquer_types(nom, df):
+    df = df.astype({colonne: type_colonne for colonne, type_colonne in SCHEMAS[nom].items() if colonne in df})
+    return df.sort_values('date', kind='stable', ignore_index=True)
+
+
+# Clé de partition (mois) de chaque ligne, calculée sur les datetime64 sans formater chaque date en texte
+def mois_partition(df):
+    return df['date'].to_numpy().astype('datetime64[M]').astype(str)
+
+
+def _dossier_table(nom, racine):
+    return os.path.join(racine, nom)
+
+
+def _dossier_partition(nom, cle, racine):
+    return os.path.join(_dossier_table(nom, racine), f'{CLE_PARTITION}={cle}')
+
+
+# Fichiers visibles de chaque mois d'une table ({'2024-01': ['part-….parquet', ...], ...}). Un stockage écrit
+# avant l'ajout du manifeste est lu en parcourant ses dossiers ; sa prochaine écriture crée le manifeste.
+def _lire_manifeste(nom, racine):
+    try:
+        with open(os.path.join(_dossier_table(nom, racine), MANIFESTE), encoding='utf-8') as fichier:
+            return json.load(fichier)
+    except FileNotFoundError:
+        pass
+
+    dossier = _dossier_table(nom, racine)
+    if not os.path.isdir(dossier):
+        return {}
+    manifeste = {}
+    for partition in os.scandir(dossier):
+        if partition.is_dir() and partition.name.startswith(f'{CLE_PARTITION}='):
+            fichiers = sorted(f.name for f in os.scandir(partition.path) if f.name.endswith('.parquet'))
+            if fichiers:
+                manifeste[partition.name.split('=', 1)[1]] = fichiers
+    return manifeste
+
+
+# Publier un manifeste : écriture dans un fichier temporaire puis renommage, les lecteurs voient l'ancien ou le
+# nouveau manifeste entier, jamais un état intermédiaire
+def _ecrire_manifeste(nom, manifeste, racine):
+    temporaire = os.path.join(_dossier_table(nom, racine), f'.{MANIFESTE}.tmp')
+    with open(temporaire, 'w', encoding='utf-8') as fichier:
+        json.dump(dict(sorted(manifeste.items())), fichier)
+    os.replace(temporaire, os.path.join(_dossier_table(nom, racine), MANIFESTE))
+
+
+# Chemins des fichiers visibles d'une table, par mois croissant, éventuellement limités aux mois debut à fin
+def fichiers_table(nom, racine=DOSSIER_DONNEES, debut=None, fin=None):
+    premier = pd.Timestamp(debut).strftime('%Y-%m') if debut is not None else ''
+    dernier = pd.Timestamp(fin).strftime('%Y-%m') if fin is not None else '9999-12'
+    return [os.path.join(_dossier_partition(nom, cle, racine), fichier)
+            for cle, fichiers in sorted(_lire_manifeste(nom, racine).items()) if premier <= cle <= dernier
+            for fichier in fichiers]
+
+
+# Le stockage est utilisable dès que des prestations y ont été écrites (ou la table demandée)
+def stockage_disponible(racine=DOSSIER_DONNEES, nom='prestations'):
+    return bool(fichiers_table(nom, racine))
+
+
+# Version des données : change dès qu'un fichier de partition est ajouté, remplacé ou supprimé.
+# Ne lit que les manifestes (et les métadonnées des fichiers), sert de clé aux caches Streamlit.
+def version_stockage(racine=DOSSIER_DONNEES):
+    if not stockage_disponible(racine):
+        return None
+
+    empreinte = []
+    for nom in SCHEMAS:
+        for fichier in fichiers_table(nom, racine):
+            stat = os.stat(fichier)
+            empreinte.append((fichier, stat.st_mtime_ns, stat.st_size))
+    return hashlib.sha1(repr(empreinte).encode()).hexdigest()[:16]
+
+
+# Écrire les lignes de df dans leurs partitions mensuelles, chaque mois dans un nouveau fichier.
+# remplacer=True écrase les partitions concernées, sinon les lignes s'ajoutent aux fichiers du mois.
+# Les nouveaux fichiers ne sont visibles qu'une fois le manifeste publié, en une fois pour tous les mois : un lecteur
+# voit toutes les partitions avant ou toutes après l'écriture, jamais une partition vide ou des lignes en double.
+# Les fichiers remplacés (et ceux laissés par une écriture interrompue) ne sont supprimés qu'ensuite.
+def _ecrire_partitions(nom, df, racine, remplacer):
+    os.makedirs(_dossier_table(nom, racine), exist_ok=True)
+    manifeste = _lire_manifeste(nom, racine)
+    remplaces = []
+
+    for cle, partition in df.groupby(mois_partition(df), sort=True):
+        chemin = _dossier_partition(nom, cle, racine)
+        os.makedirs(chemin, exist_ok=True)
+
+        fichier = f'part-{uuid.uuid4().hex}.parquet'
+        partition.to_parquet(os.path.join(chemin, fichier), index=False)
+        if remplacer:
+            manifeste[cle] = [fichier]
+            remplaces.append((chemin, fichier))
+        else:
+            manifeste[cle] = manifeste.get(cle, []) + [fichier]
+
+    _ecrire_manifeste(nom, manifeste, racine)
+    for chemin, fichier in remplaces:
+        for ancien in os.scandir(chemin):
+            if ancien.name.endswith('.parquet') and ancien.name != fichier:
+                os.remove(ancien.path)
+
+
+# Écrire une table en remplaçant les partitions mensuelles présentes dans df
+def ecrire_table(nom, df, racine=DOSSIER_DONNEES):
+    _ecrire_partitions(nom, appliquer_types(nom, df), racine, remplacer=True)
+
+
+# Regrouper en un seul fichier les partitions mensuelles qui en contiennent plusieurs après des ajouts successifs.
+# Une partition est traitée à la fois : la mémoire utilisée est bornée par le mois le plus volumineux.
+def compacter(nom, mois=None, racine=DOSSIER_DONNEES):
+    manifeste = _lire_manifeste(nom, racine)
+    for cle in sorted(manifeste if mois is None else mois):
+        if len(manifeste.get(cle, [])) > 1:
+            ecrire_table(nom, charger_table(nom, debut=f'{cle}-01', fin=f'{cle}-01', racine=racine), racine)
+
+
+# Charger une table : seules les colonnes demandées sont lues, les partitions hors période sont ignorées
+def charger_table(nom, colonnes=None, debut=None, fin=None, racine=DOSSIER_DONNEES):
+    fichiers = fichiers_table(nom, racine, debut, fin)
+    if not fichiers:
+        vide = pd.DataFrame(columns=colonnes or COLONNES[nom])
+        return appliquer_types(nom, vide)
+
+    categorielles = COLONNES_CATEGORIELLES[nom]
+    format_parquet = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=categorielles))
+    dataset = ds.dataset(fichiers, format=format_parquet)
+
+    colonnes = [c for c in (colonnes or COLONNES[nom]) if c in dataset.schema.names]
+
+    # Conversion colonne par colonne en libérant la table Arrow au fur et à mesure : pas de double copie en mémoire
+    df = dataset.to_table(columns=colonnes).to_pandas(split_blocks=True, self_destruct=True)
+    return appliquer_types(nom, df)
+
+
+# État du stockage : le manifeste de chaque table, pour savoir plus tard quels mois ont changé
+def etat_stockage(racine=DOSSIER_DONNEES):
+    return {nom: _lire_manifeste(nom, racine) for nom in SCHEMAS}
+
+
+# Mettre à jour une table déjà chargée : seuls les mois dont les fichiers ont changé depuis l'état ancien sont
+# relus, les lignes des autres mois sont conservées. Le résultat est celui de charger_table, trié par date.
+def recharger_table(nom, df, ancien, racine=DOSSIER_DONNEES):
+    nouveau = _lire_manifeste(nom, racine)
+    modifies = sorted(cle for cle in set(ancien) | set(nouveau) if ancien.get(cle) != nouveau.get(cle))
+    if not modifies:
+        return df
+
+    parties = [df[~pd.Series(mois_partition(df)).isin(modifies).to_numpy()]]
+    parties += [charger_table(nom, debut=f'{cle}-01', fin=f'{cle}-01', racine=racine) for cle in modifies
+                if cle in nouveau]
+
+    # Catégories communes à toutes les parties : la concaténation reste catégorielle, sans repasser par les chaînes
+    for colonne in COLONNES_CATEGORIELLES[nom]:
+        categories = sorted(set().union(*(partie[colonne].cat.categories for partie in parties)))
+        parties = [partie.assign(**{colonne: partie[colonne].cat.set_categories(categories)}) for partie in parties]
+    return appliquer_types(nom, pd.concat(parties, ignore_index=True))
+
+
+# Charger les quatre tables utilisées par les onglets du dashboard
+def charger_donnees(racine=DOSSIER_DONNEES):
+    return tuple(charger_table(nom, racine=racine) for nom in ('prestations', 'charges', 'absences', 'fournisseurs'))
+
+
+# Construire le cube d'agrégats à partir des prestations stockées si le stockage n'en contient pas encore
+# (stockage antérieur au cube, ou rempli par ajouts sans compléter le cube)
+def construire_cube_absent(racine=DOSSIER_DONNEES):
+    if stockage_disponible(racine) and not fichiers_table('cube', racine):
+        ecrire_table('cube', cube.construire_cube(charger_table('prestations', racine=racine)), racine)
+
+
+# Charger le cube d'agrégats matérialisé ; il est construit une fois si le stockage n'en contient pas encore
+def charger_cube(racine=DOSSIER_DONNEES):
+    construire_cube_absent(racine)
+    return charger_table('cube', racine=racine)
+
+
+# Écrire un jeu de données complet dans le stockage
+def ecrire_donnees(prestations, charges, absences, fournisseurs, racine=DOSSIER_DONNEES):
+    ecrire_table('prestations', prestations, racine)
+    ecrire_table('cube', cube.construire_cube(appliquer_types('prestations', prestations)), racine)
+    ecrire_table('charges', charges, racine)
+    ecrire_table('absences', absences, racine)
+    ecrire_table('fournisseurs', fournisseurs, racine)
+
+
+# Ajouter les cellules d'un lot au cube : seules les partitions des mois touchés sont relues et réécrites,
+# et seules les cellules des jours du lot changent (les mesures sont additives).
+def _completer_cube(cube_lot, racine):
+    for cle, cellules in cube_lot.groupby(mois_partition(cube_lot), sort=True):
+        existant = charger_table('cube', debut=f'{cle}-01', fin=f'{cle}-01', racine=racine)
+        fusion = cube.agreger(pd.concat([existant, cellules], ignore_index=True), cube.DIMENSIONS)
+        ecrire_table('cube', fusion, racine)
+
+
+# Recalculer entièrement les partitions du cube des mois donnés à partir des prestations stockées
+# (le cube est construit en entier si le stockage n'en contient pas encore)
+def reconstruire_cube(mois, racine=DOSSIER_DONNEES):
+    if not fichiers_table('cube', racine):
+        construire_cube_absent(racine)
+        return
+    for cle in sorted(mois):
+        prestations = charger_table('prestations', debut=f'{cle}-01', fin=f'{cle}-01', racine=racine)
+        ecrire_table('cube', cube.construire_cube(prestations), racine)
+
+
+# Ajouter un lot de lignes (prestations, charges, absences ou factures fournisseurs) sans recharger
+# ni réécrire les données existantes : les lignes vont dans un nouveau fichier de chaque mois concerné, et un mois
+# est compacté dès qu'il dépasse FICHIERS_MAX_PARTITION fichiers.
+# Pour les prestations, les montants dérivés sont calculés et le cube est complété pour les jours du lot
+# (completer_cube=False laisse l'appelant reconstruire le cube des mois touchés en une seule fois).
+def ajouter(nom, lot, completer_cube=True, racine=DOSSIER_DONNEES):
+    if nom == 'bonus':
+        raise ValueError("Les bonus sont enregistrés dans le registre des bonus (registre_bonus.ajouter_lot)")
+    colonnes_requises = COLONNES_SAISIES_PRESTATIONS if nom == 'prestations' else COLONNES[nom]
+    manquantes = [colonne for colonne in colonnes_requises if colonne not in lot]
+    if manquantes:
+        raise ValueError(f"Colonnes manquantes pour la table {nom} : {', '.join(manquantes)}")
+    if lot.empty:
+        return lot
+
+    lot = lot.assign(date=pd.to_datetime(lot['date']))
+    if nom == 'prestations':
+        lot = completer_prestations(lot)
+    lot = appliquer_types(nom, lot[COLONNES[nom]])
+
+    _ecrire_partitions(nom, lot, racine, remplacer=False)
+    # Les partitions qui ont accumulé trop de petits fichiers sont regroupées en un seul
+    manifeste = _lire_manifeste(nom, racine)
+    trop_fragmentes = [cle for cle in set(mois_partition(lot)) if len(manifeste[cle]) > FICHIERS_MAX_PARTITION]
+    compacter(nom, trop_fragmentes, racine)
+    if nom == 'prestations' and completer_cube and fichiers_table('cube', racine):
+        _completer_cube(cube.construire_cube(lot), racine)
+    return lot
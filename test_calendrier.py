@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import calendrier
+import stockage
+
+
+def _absences(*lignes):
+    return stockage.appliquer_types('absences', pd.DataFrame(
+        [(nom, pd.Timestamp(jour), type_absence, duree, 'Validé') for nom, jour, type_absence, duree in lignes],
+        columns=stockage.COLONNES['absences']))
+
+
+# Une absence commencée avant la période compte pour ses jours dans la période, et seulement pour ceux-là
+def test_absence_commencee_avant_la_periode():
+    absences = _absences(('Ismail', '2024-03-01', 'Congé', 5), ('Sohaib', '2024-02-20', 'Maladie', 2),
+                         ('Saddem', '2024-03-06', 'Congé', 1))
+    retenues = calendrier.absences_periode(absences, '2024-03-04', '2024-03-10')
+    assert retenues['nom'].tolist() == ['Ismail', 'Saddem']
+
+    calendrier_periode = calendrier.CalendrierAbsences(retenues).periode('2024-03-04', '2024-03-10')
+    assert calendrier_periode.absents('2024-03-04') == [('Ismail', 'Congé')]
+    assert calendrier_periode.jours_absence().to_dict() == {'Ismail': 2, 'Saddem': 1, 'Sohaib': 0}
+    assert calendrier_periode.jours_par_type().to_dict() == {'Congé': 3, 'Maladie': 0}
+
+
+# Jours fériés de 2024 : dates fixes et jours définis depuis Pâques (31 mars 2024)
+def test_jours_feries_2024():
+    assert calendrier.paques([2024, 2025])[0] == np.datetime64('2024-03-31')
+    assert calendrier.jours_feries([2024]).astype(str).tolist() == [
+        '2024-01-01', '2024-04-01', '2024-05-01', '2024-05-08', '2024-05-09', '2024-05-20', '2024-07-14',
+        '2024-08-15', '2024-11-01', '2024-11-11', '2024-12-25',
+    ]
+
+
+# Capacité d'une semaine avec un jour férié (lundi de Pâques) et une absence commencée avant la semaine
+def test_capacite_avec_ferie_et_absence_en_cours():
+    absences = _absences(('Ismail', '2024-03-28', 'Congé', 7))
+    retenues = calendrier.absences_periode(absences, '2024-04-01', '2024-04-07')
+    capacite = calendrier.capacite('2024-04-01', '2024-04-07', ['Ismail', 'Saddem'],
+                                   calendrier.CalendrierAbsences(retenues))
+
+    # Ismail est absent du 28/03 au 03/04 : seuls le jeudi 4 et le vendredi 5 avril restent disponibles
+    assert capacite.sum().to_dict() == {'Ismail': 2 * calendrier.HEURES_JOUR, 'Saddem': 4 * calendrier.HEURES_JOUR}
+    assert capacite.loc['2024-04-01'].sum() == 0
+
+
+# Taux d'utilisation mensuel : heures facturées sur heures disponibles, vide sans heures disponibles
+def test_utilisation():
+    capacite = calendrier.capacite('2024-04-01', '2024-04-07', ['Ismail', 'Saddem'],
+                                   calendrier.CalendrierAbsences(_absences(('Saddem', '2024-03-25', 'Congé', 14))))
+    cube_filtre = pd.DataFrame({'date': pd.to_datetime(['2024-04-02', '2024-04-04']),
+                                'technicien': pd.Categorical(['Ismail', 'Ismail']), 'main_oeuvre_heures': [7.0, 7.0]})
+
+    resultat = calendrier.utilisation(cube_filtre, capacite, 'Mois').set_index('technicien')
+    assert resultat.loc['Ismail', 'utilisation'] == 14 / (4 * calendrier.HEURES_JOUR)
+    assert np.isnan(resultat.loc['Saddem', 'utilisation'])
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import analyses
+import cube
+import generation
+import stockage
+
+
+def _prestations_avec_vides():
+    prestations = generation.generer_donnees(graine=1)['prestations']
+    prestations['client'] = prestations['client'].astype(object)
+    prestations['technicien'] = prestations['technicien'].astype(object)
+    prestations.loc[prestations.index[::7], 'client'] = None
+    prestations.loc[prestations.index[::11], 'technicien'] = None
+    return stockage.appliquer_types('prestations', prestations)
+
+
+# Les totaux du cube sont ceux des prestations, y compris celles dont une dimension est vide
+def test_totaux_cube_egaux_aux_prestations():
+    prestations = _prestations_avec_vides()
+    cube_prestations = cube.construire_cube(prestations)
+
+    assert cube_prestations['nb_prestations'].sum() == len(prestations)
+    for mesure in ['montant_total_ttc', 'marge_totale', 'main_oeuvre_heures', 'montant_pieces']:
+        assert np.isclose(cube_prestations[mesure].sum(), prestations[mesure].sum())
+
+    par_technicien = cube.agreger(cube_prestations, 'technicien', ['montant_total_ttc', 'nb_prestations'])
+    assert par_technicien['nb_prestations'].sum() == len(prestations)
+    assert np.isclose(analyses.indicateurs(cube_prestations)['montant_moyen'],
+                      prestations['montant_total_ttc'].mean())
+
+
+# Une seule prestation importée sans client est comptée dans le cube
+def test_prestation_sans_client():
+    prestations = _prestations_avec_vides().iloc[:1].copy()
+    prestations['client'] = pd.Categorical([None])
+    cube_prestations = cube.construire_cube(prestations)
+
+    assert cube_prestations['nb_prestations'].sum() == 1
+    assert np.isclose(cube_prestations['montant_total_ttc'].sum(), prestations['montant_total_ttc'].sum())
+
+
+# Le cube matérialisé dans le stockage et relu garde les cellules aux dimensions vides
+def test_cube_stocke(tmp_path):
+    prestations = _prestations_avec_vides()
+    stockage.ecrire_table('prestations', prestations, racine=str(tmp_path))
+    cube_stocke = stockage.charger_cube(racine=str(tmp_path))
+
+    assert cube_stocke['nb_prestations'].sum() == len(prestations)
+    assert np.isclose(cube_stocke['montant_total_ttc'].sum(), prestations['montant_total_ttc'].sum())
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import filtres
+import generation
+import stockage
+
+DOSSIER = os.path.dirname(os.path.abspath(__file__))
+
+# Le dashboard est exécuté par AppTest dans un processus séparé : le dossier du stockage et le moteur sont lus
+# dans l'environnement à l'import des modules. Le script affiche les erreurs et le nombre de prestations affiché,
+# sans filtre puis en ne gardant que les prestations sans client.
+SCRIPT = """
+import json
+from streamlit.testing.v1 import AppTest
+
+import filtres
+
+at = AppTest.from_file('Dashboard_BMA_copie.py', default_timeout=120)
+at.run()
+resultat = {'erreurs': [e.message for e in at.exception]}
+if not at.exception:
+    resultat['options'] = [m.options for m in at.multiselect if m.label == 'Client'][0]
+    resultat['total'] = [m.value for m in at.metric if m.label == 'Nombre Prestations'][0]
+    [m for m in at.multiselect if m.label == 'Client'][0].set_value([filtres.VIDE])
+    at.run()
+    resultat['erreurs'] = [e.message for e in at.exception]
+    resultat['sans_client'] = [m.value for m in at.metric if m.label == 'Nombre Prestations'][0]
+print(json.dumps(resultat))
+"""
+
+
+# Stockage dont une partie des prestations n'ont pas de client, de technicien ou de type de prestation
+def _stockage_avec_vides(racine):
+    tables = generation.generer_donnees(graine=4)
+    prestations = tables['prestations']
+    for colonne, pas in (('client', 5), ('technicien', 13), ('type_prestation', 17)):
+        prestations[colonne] = prestations[colonne].astype(object)
+        prestations.loc[prestations.index[::pas], colonne] = None
+    tables['prestations'] = stockage.appliquer_types('prestations', prestations)
+    stockage.ecrire_donnees(**{nom: df for nom, df in tables.items() if nom != 'bonus'}, racine=racine)
+    return tables['prestations']
+
+
+@pytest.mark.parametrize('moteur', ['pandas', 'duckdb'])
+def test_dashboard_prestations_sans_client(tmp_path, moteur):
+    if moteur == 'duckdb':
+        pytest.importorskip('duckdb')
+    prestations = _stockage_avec_vides(str(tmp_path))
+
+    sortie = subprocess.run([sys.executable, '-c', SCRIPT], cwd=DOSSIER, capture_output=True, text=True, check=True,
+                            env=dict(os.environ, DASHBOARD_DONNEES=str(tmp_path), DASHBOARD_MOTEUR=moteur))
+    resultat = json.loads(sortie.stdout.strip().splitlines()[-1])
+
+    assert resultat['erreurs'] == []
+    assert resultat['options'][-1] == filtres.VIDE
+    assert resultat['total'] == str(len(prestations))
+    assert resultat['sans_client'] == str(prestations['client'].isna().sum())
@@ -0,0 +1,53 @@
+import pandas as pd
+
+import echeances
+import stockage
+
+
+# Factures au schéma du stockage : (fournisseur, date de facture, montant, payée, délai de paiement)
+def _factures(*lignes):
+    return stockage.appliquer_types('fournisseurs', pd.DataFrame(
+        [(pd.Timestamp(jour), fournisseur, montant, payee, delai)
+         for fournisseur, jour, montant, payee, delai in lignes],
+        columns=['date', 'fournisseur', 'montant', 'payee', 'delai_paiement']))
+
+
+# Seules les factures impayées entrent dans l'échéancier, triées par échéance (date + délai)
+def test_echeancier():
+    echeancier = echeances.echeancier(_factures(('Flauraud', '2024-01-10', 100.0, False, 60),
+                                                ('Renault', '2024-01-20', 200.0, False, 30),
+                                                ('P&P', '2024-01-01', 300.0, True, 30)))
+    assert echeancier['fournisseur'].tolist() == ['Renault', 'Flauraud']
+    assert echeancier['echeance'].tolist() == [pd.Timestamp('2024-02-19'), pd.Timestamp('2024-03-10')]
+
+
+# Bornes des tranches : à échoir le jour de l'échéance, 30 jours de retard dans 0-30, 31 dans 30-60, 61 dans 60+
+def test_tranches_aux_bornes():
+    echeancier = echeances.echeancier(_factures(*[('Flauraud', '2024-01-01', 10.0, False, 30)] * 6))
+    situations = [echeancier['echeance'][0] + pd.Timedelta(days=retard) for retard in (0, 1, 30, 31, 60, 61)]
+    assert [echeances.tranches(echeancier.iloc[:1], situation)[0] for situation in situations] == [
+        'À échoir', '0-30 jours', '0-30 jours', '30-60 jours', '30-60 jours', '60+ jours']
+
+
+# Montants par fournisseur et par tranche, toutes les tranches présentes
+def test_anciennete():
+    echeancier = echeances.echeancier(_factures(('Flauraud', '2024-01-01', 100.0, False, 30),
+                                                ('Flauraud', '2024-02-20', 50.0, False, 30),
+                                                ('Renault', '2024-03-01', 20.0, False, 30)))
+    anciennete = echeances.anciennete(echeancier, '2024-03-31')
+    montants = anciennete.set_index(['fournisseur', 'tranche'])['montant']
+    assert montants[('Flauraud', '30-60 jours')] == 100.0
+    assert montants[('Flauraud', '0-30 jours')] == 50.0
+    assert montants[('Renault', 'À échoir')] == 20.0
+    assert len(anciennete) == 2 * len(echeances.TRANCHES)
+
+
+# Factures dues dans la semaine du lundi au dimanche, les deux jours inclus, y compris une facture émise
+# longtemps avant la semaine
+def test_dues_dans_la_semaine():
+    echeancier = echeances.echeancier(_factures(('Flauraud', '2023-11-13', 1.0, False, 60),
+                                                ('Renault', '2024-01-10', 2.0, False, 5),
+                                                ('P&P', '2024-01-14', 4.0, False, 0),
+                                                ('Renault', '2024-01-15', 8.0, False, 0)))
+    dues = echeances.dues_entre(echeancier, '2024-01-08', '2024-01-14')
+    assert dues['montant'].tolist() == [1.0, 4.0]
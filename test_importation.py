@@ -0,0 +1,44 @@
+import pandas as pd
+
+import importation
+import registre_bonus
+import stockage
+
+
+def _importer_charges(tmp_path, dates, **options):
+    chemin = tmp_path / 'charges.csv'
+    pd.DataFrame({'date': dates, 'type': 'Loyer', 'montant': 100.0, 'payee': 'oui'}).to_csv(chemin, index=False)
+    racine = str(tmp_path / 'donnees')
+    importation.importer(chemin, 'charges', racine=racine, **options)
+    return stockage.charger_table('charges', racine=racine)['date'].sort_values().tolist()
+
+
+# Les dates ISO sont lues telles quelles, que le jour dépasse 12 ou non
+def test_dates_iso(tmp_path):
+    dates = _importer_charges(tmp_path, ['2024-01-05', '2024-03-15', '2024-12-11'])
+    assert dates == [pd.Timestamp('2024-01-05'), pd.Timestamp('2024-03-15'), pd.Timestamp('2024-12-11')]
+
+
+# Les dates des exports français (jour/mois/année) sont lues jour en premier
+def test_dates_jour_mois_annee(tmp_path):
+    dates = _importer_charges(tmp_path, ['05/01/2024', '15/03/2024', '11/12/2024'])
+    assert dates == [pd.Timestamp('2024-01-05'), pd.Timestamp('2024-03-15'), pd.Timestamp('2024-12-11')]
+
+
+def test_dates_mois_jour_annee(tmp_path):
+    dates = _importer_charges(tmp_path, ['01/05/2024', '03/15/2024', '12/11/2024'], jour_en_premier=False)
+    assert dates == [pd.Timestamp('2024-01-05'), pd.Timestamp('2024-03-15'), pd.Timestamp('2024-12-11')]
+
+
+# Les bonus importés sont enregistrés dans le registre lu par le dashboard, pas dans le stockage Parquet
+def test_bonus_dans_le_registre(tmp_path):
+    chemin = tmp_path / 'bonus.csv'
+    pd.DataFrame({'date': ['15/03/2024', '01/04/2024'], 'amount': [120.5, 80.0],
+                  'description': ['Prime', None]}).to_csv(chemin, index=False)
+    racine = str(tmp_path / 'donnees')
+    importation.importer(chemin, 'bonus', racine=racine)
+
+    bonus = registre_bonus.lister(registre_bonus.chemin_registre(racine))
+    assert bonus['date'].tolist() == [pd.Timestamp('2024-03-15'), pd.Timestamp('2024-04-01')]
+    assert bonus['amount'].tolist() == [120.5, 80.0]
+    assert stockage.charger_table('bonus', racine=racine).empty
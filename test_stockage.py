@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+
+import generation
+import stockage
+
+
+def _charges():
+    return generation.generer_donnees(graine=5)['charges']
+
+
+# Des ajouts successifs puis leur compaction ne perdent ni ne dupliquent aucune ligne
+def test_ajouts_puis_compaction(tmp_path):
+    racine = str(tmp_path)
+    charges = _charges()
+    for i in range(0, len(charges), 10):
+        stockage.ajouter('charges', charges.iloc[i:i + 10], racine=racine)
+    stockage.compacter('charges', racine=racine)
+
+    pd.testing.assert_frame_equal(stockage.charger_table('charges', racine=racine), charges)
+    for cle in set(stockage.mois_partition(charges)):
+        assert len(os.listdir(os.path.join(racine, 'charges', f'mois={cle}'))) == 1
+
+
+# Un fichier écrit mais absent du manifeste (écriture interrompue) n'est pas lu, puis disparaît au remplacement
+# de sa partition
+def test_fichier_hors_manifeste_ignore(tmp_path):
+    racine = str(tmp_path)
+    charges = _charges()
+    stockage.ecrire_table('charges', charges, racine)
+
+    premier_mois = charges[stockage.mois_partition(charges) == stockage.mois_partition(charges)[0]]
+    dossier = os.path.join(racine, 'charges', f'mois={stockage.mois_partition(charges)[0]}')
+    premier_mois.to_parquet(os.path.join(dossier, 'part-interrompu.parquet'), index=False)
+    pd.testing.assert_frame_equal(stockage.charger_table('charges', racine=racine), charges)
+
+    stockage.ecrire_table('charges', premier_mois, racine)
+    assert len(os.listdir(dossier)) == 1
+    pd.testing.assert_frame_equal(stockage.charger_table('charges', racine=racine), charges)
+
+
+# Une table rechargée après un ajout et un remplacement est celle qu'on relirait en entier
+def test_rechargement_des_mois_modifies(tmp_path):
+    racine = str(tmp_path)
+    tables = generation.generer_donnees(graine=6)
+    stockage.ecrire_table('prestations', tables['prestations'], racine)
+    etat = stockage.etat_stockage(racine)
+    prestations = stockage.charger_table('prestations', racine=racine)
+
+    nouvelles = generation.generer_donnees(2025, graine=7)['prestations'].iloc[:20]
+    stockage.ajouter('prestations', nouvelles.assign(client='Nouveau client'), racine=racine)
+    premier_mois = prestations[prestations['date'] < '2024-02-01']
+    stockage.ecrire_table('prestations', premier_mois.iloc[::2], racine)
+
+    recharge = stockage.recharger_table('prestations', prestations, etat['prestations'], racine)
+    pd.testing.assert_frame_equal(recharge, stockage.charger_table('prestations', racine=racine),
+                                  check_categorical=False)
+    assert 'Nouveau client' in recharge['client'].cat.categories